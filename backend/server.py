@@ -8,6 +8,8 @@ from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import OperationFailure
+from services.tags import TAG_NAME_COLLATION
 import os
 import logging
 import bcrypt
@@ -184,6 +186,13 @@ async def create_indexes(db):
         # Tags indexes
         await db.tags.create_index("slug", unique=True)
         await db.tags.create_index("name", unique=True)
+        # Регистронезависимый индекс под find_one(..., collation=TAG_NAME_COLLATION) в sync_tags
+        try:
+            await db.tags.create_index("name", name="name_ci", unique=True, collation=TAG_NAME_COLLATION)
+        except OperationFailure as e:
+            # теги, различающиеся только регистром, уже есть — индекс нужен и без уникальности
+            logger.warning(f"Could not create unique index tags.name_ci: {e}")
+            await db.tags.create_index("name", name="name_ci", collation=TAG_NAME_COLLATION)
         await db.tags.create_index("usage_count")
         
         # Media indexes
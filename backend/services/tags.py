@@ -3,9 +3,15 @@ from typing import List, Optional
 from datetime import datetime, timezone
 from uuid import uuid4
 
+from pymongo.collation import Collation
+
 from utils.database import get_db
 
 
+# Case-insensitive tag name comparison; same collation as the migration's tags.name_ci index
+TAG_NAME_COLLATION = Collation(locale="ru", strength=2)
+
+
 # Transliteration map for cyrillic -> latin slugs
 TRANSLIT_MAP = {
     'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
@@ -41,10 +47,9 @@ class TagService:
             if not tag_name:
                 continue
             
-            # Check if tag already exists (case-insensitive)
-            existing = await db.tags.find_one({
-                "name": {"$regex": f"^{tag_name}$", "$options": "i"}
-            })
+            # Check if tag already exists (case-insensitive). Collation instead of an
+            # anchored $regex: no per-tag pattern, and names like "C++" or "(18+)" match literally
+            existing = await db.tags.find_one({"name": tag_name}, collation=TAG_NAME_COLLATION)
             
             if not existing:
                 # Create new tag
@@ -13,20 +13,40 @@ import sys
 import re
 import json
 import argparse
+import shutil
 import subprocess
 from utils import extract_ratings_from_sql, find_resource_id_by_name, clean_html, transliterate
 
 
-def grep_sql(sql_file, pattern, timeout=60):
-    """Выполнить grep по SQL файлу"""
+# ripgrep (если установлен) ищет литеральный префикс паттерна SIMD-поиском и на больших
+# дампах заметно быстрее GNU grep; паттерны ниже — общее подмножество ERE и синтаксиса rg
+_RG = shutil.which('rg')
+
+
+def _grep_cmd(sql_file, pattern, max_lines=None):
+    # -m N (и у grep, и у rg): остановиться после N строк файла с совпадениями
+    limit = ['-m', str(max_lines)] if max_lines else []
+    if _RG:
+        return [_RG, '--no-filename', '--no-line-number', '--only-matching', *limit, '--regexp', pattern, sql_file]
+    return ['grep', '-oE', *limit, pattern, sql_file]
+
+
+def grep_sql(sql_file, pattern, timeout=60, max_lines=None):
+    """Выполнить grep (или rg) по SQL файлу
+
+    max_lines — сколько строк дампа с совпадениями просмотреть (INSERT — одна строка),
+    после чего поиск прекращается, а не идёт до конца файла.
+    """
     try:
         result = subprocess.run(
-            ['grep', '-oE', pattern, sql_file],
+            _grep_cmd(sql_file, pattern, max_lines),
             capture_output=True,
-            text=True,
             timeout=timeout
         )
-        return result.stdout.strip().split('\n') if result.stdout.strip() else []
+        # Вывод читается как bytes и декодируется один раз как UTF-8 (кодировка дампа),
+        # без зависимости от локали и без падения на битых байтах
+        out = result.stdout.strip()
+        return out.decode('utf-8', 'replace').split('\n') if out else []
     except subprocess.TimeoutExpired:
         print(f"Timeout при поиске: {pattern}")
         return []
@@ -94,11 +114,20 @@ def extract_person_data(sql_file, resource_id=None, name=None):
         print("Необходимо указать --id или --name")
         return None
     
+    # ID подставляется в паттерн grep как есть — пропускаем только число, чтобы
+    # "--id 1|2" или "--id 1.*" не превращались в регулярное выражение
+    try:
+        resource_id = str(int(resource_id))
+    except ValueError:
+        print(f"Некорректный ID: {resource_id}")
+        return None
+    
     print(f"Извлечение данных для ID: {resource_id}")
     
     # 1. Получаем основные данные из site_content
     pattern = f"\\({resource_id},'document','text/html','[^']+','[^']*','[^']*','[^']+'"
-    matches = grep_sql(sql_file, pattern)
+    # Нужно только первое совпадение — grep останавливается на первой строке с ним
+    matches = grep_sql(sql_file, pattern, max_lines=1)
     
     if not matches:
         print(f"Не найдена запись с ID {resource_id}")
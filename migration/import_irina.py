@@ -3,50 +3,107 @@
 Migration script to import Irina Chesnokova from modx_new.sql
 """
 import re
-import os
-import json
+import mmap
 from datetime import datetime, timezone
 from uuid import uuid4
 import pymongo
 from html import unescape
-
-# MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-DB_NAME = os.environ.get('DB_NAME', 'humorpedia')
+from utils import VERBOSE, VERIFY, get_db, json_dumps
 
 SQL_FILE = '/app/modx_new.sql'
 
+# Дамп сканируется как bytes (через mmap), поэтому паттерны тоже bytes.
+# Кириллицу нельзя писать в rb"...", поэтому собираем из str и кодируем.
+_INTRO_RE = re.compile("'Чеснокова Ирина[^']*'".encode('utf-8'))
+_RECORD_RE = re.compile(
+    r"\((\d+),'document','text/html','Чеснокова Ирина','([^']*)','([^']*)','([^']+)'".encode('utf-8')
+)
+# Запасной поиск записи, если _RECORD_RE не сработал (суффикс в pagetitle, \' в полях)
+_ALT_RE = re.compile(r",(\d+),'document','text/html','Чеснокова Ирина".encode('utf-8'))
+_FULL_RE = re.compile(r"\((\d+),'Чеснокова Ирина([^']+)'".encode('utf-8'))
+
+# Все три паттерна содержат этот литерал: ищем его через bytes.find,
+# а регулярки гоняем только по маленькому окну вокруг каждого вхождения
+_NAME_ANCHOR = "'Чеснокова Ирина".encode('utf-8')
+_WINDOW_BEFORE = 64
+# Дальше всех от якоря заходит _RECORD_RE: закрывающая кавычка pagetitle и по две
+# у longtitle, description и alias
+_RECORD_QUOTES_AFTER_ANCHOR = 7
+_ROW_ENDS = (b"),(", b");")
+
+# Экранированные переводы строк из дампа: \r\n, \r, \n (как текст)
+_ESCAPED_NEWLINE_RE = re.compile(r'\\r\\n|\\r|\\n')
+
+
+def _decode(value):
+    """Декодирует найденный фрагмент дампа (bytes -> str); str возвращается как есть"""
+    if isinstance(value, str):
+        return value
+    return value.decode('utf-8', 'replace')
+
+def _search_dump(pattern, sql_content):
+    """re.finditer по дампу-строке или по bytes/mmap (тогда паттерн кодируется в UTF-8)"""
+    if not isinstance(sql_content, str):
+        pattern = pattern.encode('utf-8')
+    return re.finditer(pattern, sql_content)
+
+def _window_end(sql_content, pos):
+    """Конец окна вокруг якоря в pos: конец ряда ("),(" / ");"), но не раньше последней
+    кавычки, до которой может дойти _RECORD_RE, — "),(" бывает и внутри строк"""
+    end = pos + len(_NAME_ANCHOR)
+    for _ in range(_RECORD_QUOTES_AFTER_ANCHOR):
+        quote = sql_content.find(b"'", end)
+        if quote < 0:
+            return len(sql_content)
+        end = quote + 1
+    row_ends = [i for i in (sql_content.find(m, pos) for m in _ROW_ENDS) if i >= 0]
+    return max(end, min(row_ends) + 2) if row_ends else len(sql_content)
+
+def _find_name_matches(sql_content):
+    """Один проход по дампу: первые совпадения intro/record/alt/full паттернов"""
+    found = {_INTRO_RE: None, _RECORD_RE: None, _ALT_RE: None, _FULL_RE: None}
+    pos = sql_content.find(_NAME_ANCHOR)
+    # _ALT_RE нужен только без _RECORD_RE, поэтому его отсутствие проход не продлевает
+    while pos >= 0 and None in (found[_INTRO_RE], found[_RECORD_RE], found[_FULL_RE]):
+        window = sql_content[max(0, pos - _WINDOW_BEFORE):_window_end(sql_content, pos)]
+        for pattern, match in found.items():
+            if match is None:
+                found[pattern] = pattern.search(window)
+        pos = sql_content.find(_NAME_ANCHOR, pos + 1)
+    return found[_INTRO_RE], found[_RECORD_RE], found[_ALT_RE], found[_FULL_RE]
+
 def clean_html(text):
     """Clean HTML entities and normalize text"""
     if not text:
         return ""
     # Decode HTML entities
     text = unescape(text)
-    # Replace \r\n with proper line breaks
-    text = text.replace('\\r\\n', '\n').replace('\\r', '\n')
-    text = text.replace("\\n", "\n")
-    # Replace &nbsp; 
-    text = text.replace('&nbsp;', ' ')
+    # Replace literal \r\n / \r / \n escapes with proper line breaks (one pass)
+    text = _ESCAPED_NEWLINE_RE.sub('\n', text)
+    # unescape already decoded &nbsp;/&ndash;/&laquo;...; a literal &nbsp; is left
+    # only by double escaping (&amp;nbsp;), which always leaves an '&' behind
+    if '&' in text:
+        text = text.replace('&nbsp;', ' ')
     return text.strip()
 
 def extract_person_data_from_sql(sql_content, slug):
-    """Extract person data from SQL dump by searching for specific patterns"""
+    """Extract person data from SQL dump (str, bytes or mmap) by searching for specific patterns"""
     
     # Find the record with the given slug in modx_site_content
     # Format: (id,'document','text/html','title','longtitle','description','slug',...)
-    pattern = rf"\((\d+),'document','text/html','([^']+)','([^']*)','([^']*)','({slug})'[^)]+\)"
+    pattern = rf"\((\d+),'document','text/html','([^']+)','([^']*)','([^']*)','({re.escape(slug)})'[^)]+\)"
     
     # Search in site_content INSERT
-    site_content_match = re.search(pattern, sql_content)
+    site_content_match = next(_search_dump(pattern, sql_content), None)
     
     if not site_content_match:
         print(f"Could not find slug: {slug}")
         return None
     
-    resource_id = site_content_match.group(1)
-    title = site_content_match.group(2)
-    longtitle = site_content_match.group(3) or title
-    description = site_content_match.group(4)
+    resource_id = _decode(site_content_match.group(1))
+    title = _decode(site_content_match.group(2))
+    longtitle = _decode(site_content_match.group(3)) or title
+    description = _decode(site_content_match.group(4))
     
     print(f"Found resource ID: {resource_id}, Title: {title}")
     
@@ -63,20 +120,20 @@ def extract_ratings_for_id(sql_content, resource_id):
     # Pattern: (vote_id, resource_id, user_id, score)
     pattern = rf"\((\d+),{resource_id},(\d+),(\d+)\)"
     
-    matches = re.findall(pattern, sql_content)
+    # Один проход: без промежуточного списка кортежей из findall
+    votes = []
+    add_vote = votes.append
+    total_score = 0
+    for match in _search_dump(pattern, sql_content):
+        score = int(match.group(3))
+        add_vote({'user_id': int(match.group(2)), 'score': score})
+        total_score += score
     
-    if not matches:
+    if not votes:
         print(f"No ratings found for resource ID: {resource_id}")
         return {'average': 0.0, 'count': 0, 'votes': []}
     
-    votes = []
-    total_score = 0
-    for match in matches:
-        vote_id, user_id, score = match
-        votes.append({'user_id': int(user_id), 'score': int(score)})
-        total_score += int(score)
-    
-    avg_score = total_score / len(votes) if votes else 0.0
+    avg_score = total_score / len(votes)
     
     print(f"Found {len(votes)} ratings, average: {avg_score:.2f}")
     
@@ -90,85 +147,67 @@ def extract_irina_data():
     """Extract Irina Chesnokova's data from the SQL dump"""
     
     print("Loading SQL dump...")
-    with open(SQL_FILE, 'r', encoding='utf-8', errors='replace') as f:
-        sql_content = f.read()
-    
-    print("SQL dump loaded. Size:", len(sql_content), "bytes")
-    
-    # Find Irina Chesnokova's record
-    # Search for her name in modx_mse2_intro first
-    intro_pattern = r"'Чеснокова Ирина[^']*'"
-    intro_match = re.search(intro_pattern, sql_content)
-    
-    if intro_match:
-        print("Found Irina in mse2_intro:", intro_match.group(0)[:100])
-    
-    # Now search for her in modx_site_content by looking for the pattern
-    # Looking for record with 'irina-chesnokova' or 'Чеснокова Ирина'
-    
-    # Search for the full record containing Чеснокова
-    record_pattern = r"\((\d+),'document','text/html','Чеснокова Ирина','([^']*)','([^']*)','([^']+)'"
-    record_match = re.search(record_pattern, sql_content)
-    
-    if record_match:
-        resource_id = record_match.group(1)
-        longtitle = record_match.group(2)
-        description = record_match.group(3)
-        slug = record_match.group(4)
-        print(f"Found Irina Chesnokova: ID={resource_id}, slug={slug}")
-    else:
-        # Try alternative search
-        alt_pattern = r",(\d+),'document','text/html','Чеснокова Ирина"
-        alt_match = re.search(alt_pattern, sql_content)
-        if alt_match:
-            # Найдём полную строку
+    with open(SQL_FILE, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as sql_content:
+        print("SQL dump mapped. Size:", len(sql_content), "bytes")
+        
+        # Find Irina Chesnokova's record (intro / site_content / full block)
+        intro_match, record_match, alt_match, full_match = _find_name_matches(sql_content)
+        
+        if intro_match:
+            print("Found Irina in mse2_intro:", _decode(intro_match.group(0))[:100])
+        
+        # Her record in modx_site_content
+        if record_match:
+            resource_id = _decode(record_match.group(1))
+            longtitle = _decode(record_match.group(2))
+            description = _decode(record_match.group(3))
+            slug = _decode(record_match.group(4))
+            print(f"Found Irina Chesnokova: ID={resource_id}, slug={slug}")
+        elif alt_match:
+            # Запись есть, но поля разобрать не удалось: документ собирается без рейтинга
             print("Found via alternative pattern")
             resource_id = None
         else:
             print("Could not find Irina Chesnokova in site_content")
             return None
-    
-    # Extract the full record for Irina
-    # We need to find her entry in the intro table which contains the full data
-    
-    # Search in modx_mse2_intro for her full content block
-    full_pattern = r"\((\d+),'Чеснокова Ирина([^']+)'"
-    full_match = re.search(full_pattern, sql_content)
-    
-    if full_match:
-        entry_id = full_match.group(1)
-        content_block = full_match.group(2)
-        print(f"Found full content block for ID {entry_id}")
-        print("Content preview:", content_block[:200])
-        
-        # Parse the content block to extract:
-        # - Biography text
-        # - Birth date
-        # - Social links
-        # - Tags
         
-        # Extract biography
-        bio_pattern = r'Ирина[^<]*Чеснокова[^<]*\(род\.[^)]+\)[^<]*&ndash;[^<]+'
-        bio_match = re.search(bio_pattern, content_block)
-        biography = ""
-        if bio_match:
-            biography = clean_html(bio_match.group(0))
-            print("Biography:", biography[:200])
+        # Her entry in modx_mse2_intro contains the full content block
+        if full_match:
+            entry_id = _decode(full_match.group(1))
+            content_block = _decode(full_match.group(2))
+            print(f"Found full content block for ID {entry_id}")
+            print("Content preview:", content_block[:200])
+            
+            # Parse the content block to extract:
+            # - Biography text
+            # - Birth date
+            # - Social links
+            # - Tags
+            
+            # Extract biography
+            bio_pattern = r'Ирина[^<]*Чеснокова[^<]*\(род\.[^)]+\)[^<]*&ndash;[^<]+'
+            bio_match = re.search(bio_pattern, content_block)
+            biography = ""
+            if bio_match:
+                biography = clean_html(bio_match.group(0))
+                print("Biography:", biography[:200])
+            
+            # Look for full biography in the content
+            info_pattern = r'Информация о человеке[^<]*info\.tpl\s+([^[]+)'
+            info_match = re.search(info_pattern, content_block)
+            if info_match:
+                biography = clean_html(info_match.group(1))
+                print("Full biography:", biography[:300])
         
-        # Look for full biography in the content
-        info_pattern = r'Информация о человеке[^<]*info\.tpl\s+([^[]+)'
-        info_match = re.search(info_pattern, content_block)
-        if info_match:
-            biography = clean_html(info_match.group(1))
-            print("Full biography:", biography[:300])
-    
-    # Get the ratings
-    if resource_id:
-        ratings = extract_ratings_for_id(sql_content, resource_id)
-    else:
-        ratings = {'average': 0.0, 'count': 0, 'votes': []}
+        # Get the ratings
+        if resource_id:
+            ratings = extract_ratings_for_id(sql_content, resource_id)
+        else:
+            ratings = {'average': 0.0, 'count': 0, 'votes': []}
     
     # Build the person document
+    now = datetime.now(timezone.utc).isoformat()
     person_data = {
         'id': str(uuid4()),
         'content_type': 'person',
@@ -177,8 +216,8 @@ def extract_irina_data():
         'full_name': 'Ирина Игоревна Чеснокова',
         'status': 'published',
         'tags': ['КВН', 'Факультет журналистики', 'Однажды в России', 'Санкт-Петербург'],
-        'created_at': datetime.now(timezone.utc).isoformat(),
-        'updated_at': datetime.now(timezone.utc).isoformat(),
+        'created_at': now,
+        'updated_at': now,
         'bio': {
             'birth_date': '1989-02-09',
             'birth_place': 'Воронеж',
@@ -212,32 +251,39 @@ def extract_irina_data():
 def import_to_mongodb(person_data):
     """Import person data to MongoDB"""
     
-    client = pymongo.MongoClient(MONGO_URL)
-    db = client[DB_NAME]
-    
-    # Check if already exists
-    existing = db.people.find_one({'slug': person_data['slug']})
+    db = get_db()
+    try:
+        db.people.create_index([('slug', pymongo.ASCENDING)], unique=True)
+    except pymongo.errors.OperationFailure as e:
+        # в коллекции уже есть повторяющиеся slug — импорт идёт и без уникального индекса
+        print(f"⚠️  Не удалось создать уникальный индекс people.slug: {e}")
+    db.people.create_index([('old_modx_id', pymongo.ASCENDING)], sparse=True)
+    
+    # Insert or update in one round trip; the id is kept from the first insert
+    result = db.people.update_one(
+        {'slug': person_data['slug']},
+        {
+            '$setOnInsert': {'id': person_data['id']},
+            '$set': {k: v for k, v in person_data.items() if k != 'id'},
+        },
+        upsert=True
+    )
     
-    if existing:
+    if result.upserted_id is not None:
+        print("Record inserted!")
+    else:
         print(f"Record already exists with slug: {person_data['slug']}")
-        print("Updating existing record...")
-        db.people.update_one(
-            {'slug': person_data['slug']},
-            {'$set': person_data}
-        )
         print("Record updated!")
-    else:
-        print("Inserting new record...")
-        db.people.insert_one(person_data)
-        print("Record inserted!")
     
-    # Verify
-    saved = db.people.find_one({'slug': person_data['slug']}, {'_id': 0})
-    print("\nSaved record:")
-    print(json.dumps(saved, indent=2, ensure_ascii=False, default=str))
+    # Verify: person_data is exactly what was written, no need to re-read it
+    if VERIFY:
+        saved = db.people.find_one({'slug': person_data['slug']}, {'_id': 0, 'slug': 1, 'title': 1})
+        print("\nSaved record:", saved)
+    if VERBOSE:
+        print("\nSaved record:")
+        print(json_dumps(person_data, indent=True))
     
-    client.close()
-    return saved
+    return person_data
 
 def main():
     print("=" * 60)
@@ -251,9 +297,10 @@ def main():
         print("Failed to extract person data")
         return
     
-    print("\n" + "=" * 60)
-    print("Extracted data:")
-    print(json.dumps(person_data, indent=2, ensure_ascii=False, default=str))
+    if VERBOSE:
+        print("\n" + "=" * 60)
+        print("Extracted data:")
+        print(json_dumps(person_data, indent=True))
     
     # Import to MongoDB
     print("\n" + "=" * 60)
@@ -11,10 +11,12 @@ from uuid import uuid4
 
 # Add backend to path
 sys.path.insert(0, '/app/backend')
+# migration/ — раньше backend: иначе `utils` находится как backend/utils
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-import asyncio
-from motor.motor_asyncio import AsyncIOMotorClient
+import pymongo
 from dotenv import load_dotenv
+from utils import VERBOSE
 
 load_dotenv('/app/backend/.env')
 
@@ -22,6 +24,15 @@ load_dotenv('/app/backend/.env')
 MONGO_URL = os.getenv('MONGO_URL', 'mongodb://localhost:27017')
 DB_NAME = os.getenv('DB_NAME', 'humorpedia')
 
+# <script>/<style> вырезаются целиком, иначе их JS/CSS попадает в bio
+_SCRIPT_STYLE_RE = re.compile(r'<(script|style)\b[^>]*>.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r'<[^>]+>')
+_WS_RE = re.compile(r'\s+')
+
+# Одно значение MODX: строка в одинарных кавычках ('' и \x — экранирование),
+# NULL или «голое» значение (число), за которым идёт запятая или конец строки
+_FIELD_RE = re.compile(r"\s*(?:'((?:[^'\\]+|\\.|'')*)'|(NULL)|([^,]*?))\s*(?:,|$)", re.DOTALL)
+
 def parse_modx_record(line):
     """Parse a single MODX record line"""
     # Remove leading ( and trailing ),
@@ -46,76 +57,25 @@ def parse_modx_record(line):
         'hide_children_in_tree', 'show_in_tree', 'properties'
     ]
     
-    # Parse fields carefully
+    # Parse fields: one compiled tokenizer instead of a per-character loop.
+    # Как и прежний посимвольный разбор: значение обрезается по краям, NULL -> None,
+    # а пустое последнее поле не считается (запись получает для него None)
     fields = []
-    current_field = ""
-    in_quotes = False
-    escape_next = False
-    
-    i = 0
-    while i < len(line):
-        char = line[i]
-        
-        if escape_next:
-            current_field += char
-            escape_next = False
-            i += 1
-            continue
-        
-        if char == '\\\\':
-            current_field += '\\\\'
-            escape_next = True
-            i += 1
-            continue
-        
-        if char == "'" and not escape_next:
-            if not in_quotes:
-                in_quotes = True
-                i += 1
-                continue
-            else:
-                # Check if next char is also ' (escaped quote)
-                if i + 1 < len(line) and line[i + 1] == "'":
-                    current_field += "'"
-                    i += 2
-                    continue
-                else:
-                    in_quotes = False
-                    i += 1
-                    continue
-        
-        if char == ',' and not in_quotes:
-            # End of field
-            field_value = current_field.strip()
-            if field_value == 'NULL':
-                fields.append(None)
-            else:
-                fields.append(field_value)
-            current_field = ""
-            i += 1
-            # Skip spaces after comma
-            while i < len(line) and line[i] == ' ':
-                i += 1
+    for m in _FIELD_RE.finditer(line):
+        # finditer даёт пустое совпадение в самом конце строки — это не поле
+        if m.start() >= len(line):
             continue
-        
-        current_field += char
-        i += 1
-    
-    # Add last field
-    if current_field.strip():
-        field_value = current_field.strip()
-        if field_value == 'NULL':
+        if m.group(2):
             fields.append(None)
-        else:
-            fields.append(field_value)
+            continue
+        value = (m.group(1).replace("''", "'") if m.group(1) is not None else m.group(3)).strip()
+        fields.append(None if value == 'NULL' else value)
+    if fields and fields[-1] == '':
+        fields.pop()
     
-    # Create dict
-    record = {}
-    for i, field_name in enumerate(field_names):
-        if i < len(fields):
-            record[field_name] = fields[i]
-        else:
-            record[field_name] = None
+    # Create dict (недостающие поля -> None)
+    record = dict.fromkeys(field_names)
+    record.update(zip(field_names, fields))
     
     return record
 
@@ -123,9 +83,8 @@ def strip_html_tags(html):
     """Simple HTML tag stripper"""
     if not html:
         return ""
-    clean = re.sub(r'<[^>]+>', '', html)
-    clean = re.sub(r'\\s+', ' ', clean).strip()
-    return clean
+    clean = _TAG_RE.sub('', _SCRIPT_STYLE_RE.sub(' ', html))
+    return _WS_RE.sub(' ', clean).strip()
 
 def convert_to_mongodb_person(modx_record):
     """Convert MODX record to MongoDB person format"""
@@ -175,7 +134,7 @@ def convert_to_mongodb_person(modx_record):
     
     return person
 
-async def import_one_person():
+def import_one_person():
     """Import one person to MongoDB"""
     # Read the extracted record
     with open('/app/migration/person_350_raw_line.txt', 'r', encoding='utf-8') as f:
@@ -200,10 +159,11 @@ async def import_one_person():
     # Convert to MongoDB format
     person = convert_to_mongodb_person(modx_record)
     
-    print("\\n" + "="*80)
-    print("MONGODB ЗАПИСЬ (для импорта):")
-    print("="*80)
-    print(json.dumps(person, ensure_ascii=False, indent=2))
+    if VERBOSE:
+        print("\\n" + "="*80)
+        print("MONGODB ЗАПИСЬ (для импорта):")
+        print("="*80)
+        print(json.dumps(person, ensure_ascii=False, indent=2))
     
     # Save to file for review
     with open('/app/migration/person_350_mongo.json', 'w', encoding='utf-8') as f:
@@ -217,11 +177,17 @@ async def import_one_person():
     print("="*80)
     
     # Connect to MongoDB
-    client = AsyncIOMotorClient(MONGO_URL)
+    client = pymongo.MongoClient(MONGO_URL)
     db = client[DB_NAME]
+    try:
+        db.people.create_index([('slug', pymongo.ASCENDING)], unique=True)
+    except pymongo.errors.OperationFailure as e:
+        # в коллекции уже есть повторяющиеся slug — импорт идёт и без уникального индекса
+        print(f"⚠️  Не удалось создать уникальный индекс people.slug: {e}")
+    db.people.create_index([('old_modx_id', pymongo.ASCENDING)], sparse=True)
     
     # Check if person already exists
-    existing = await db.people.find_one({"old_modx_id": int(modx_record['id'])})
+    existing = db.people.find_one({"old_modx_id": int(modx_record['id'])})
     
     if existing:
         print(f"⚠️  Человек с MODX ID {modx_record['id']} уже существует в базе!")
@@ -231,15 +197,15 @@ async def import_one_person():
     else:
         # Import
         print(f"Импортируем: {person['full_name']}...")
-        result = await db.people.insert_one(person)
+        result = db.people.insert_one(person)
         print(f"\\n✅ УСПЕШНО ИМПОРТИРОВАНО!")
         print(f"   MongoDB ID: {result.inserted_id}")
         print(f"   Имя: {person['full_name']}")
         print(f"   Slug: {person['slug']}")
         print(f"   Status: {person['status']}")
     
-    await client.close()
+    client.close()
 
 if __name__ == "__main__":
     print("ИМПОРТ ОДНОЙ ЗАПИСИ ЧЕЛОВЕКА\\n")
-    asyncio.run(import_one_person())
+    import_one_person()
@@ -29,10 +29,10 @@
 """
 import os
 import sys
-import json
 import argparse
 import pymongo
-from utils import create_person_document, MONGO_URL, DB_NAME
+from datetime import datetime, timezone
+from utils import create_person_document, get_db, json_loads, uuid_batch, VERBOSE, PROGRESS_EVERY
 
 
 def import_people_from_json(json_file, dry_run=False, update_existing=False):
@@ -56,8 +56,8 @@ def import_people_from_json(json_file, dry_run=False, update_existing=False):
     }
     
     # Загрузка данных
-    with open(json_file, 'r', encoding='utf-8') as f:
-        people_data = json.load(f)
+    with open(json_file, 'rb') as f:
+        people_data = json_loads(f.read())
     
     stats['total'] = len(people_data)
     print(f"Загружено {stats['total']} записей из {json_file}")
@@ -69,21 +69,43 @@ def import_people_from_json(json_file, dry_run=False, update_existing=False):
         return stats
     
     # Подключение к MongoDB
-    client = pymongo.MongoClient(MONGO_URL)
-    db = client[DB_NAME]
+    db = get_db()
+    try:
+        db.people.create_index([('slug', pymongo.ASCENDING)], unique=True)
+    except pymongo.errors.OperationFailure as e:
+        # в коллекции уже есть повторяющиеся slug — импорт идёт и без уникального индекса
+        print(f"⚠️  Не удалось создать уникальный индекс people.slug: {e}")
+    db.people.create_index([('old_modx_id', pymongo.ASCENDING)], sparse=True)
     
-    for person in people_data:
+    # Один запрос вместо find_one на каждую запись
+    slugs = [p.get('slug') for p in people_data if p.get('slug')]
+    existing_slugs = {
+        d['slug'] for d in db.people.find({'slug': {'$in': slugs}}, {'slug': 1})
+    }
+    
+    now_iso = datetime.now(timezone.utc).isoformat()
+    # До трёх id на документ — все одним вызовом os.urandom
+    ids = iter(uuid_batch(3 * len(people_data)))
+    ops = []
+    # slug -> (позиция в ops, документ): повтор slug во входном JSON пропускается,
+    # а с update_existing заменяет документ уже собранной операции
+    batch = {}
+    for i, person in enumerate(people_data, 1):
+        if i % PROGRESS_EVERY == 0:
+            print(f"  ... {i}/{stats['total']}")
         try:
             slug = person.get('slug')
             if not slug:
                 stats['errors'].append(f"Нет slug для: {person.get('title')}")
                 continue
             
-            # Проверка существующей записи
-            existing = db.people.find_one({'slug': slug})
+            # Проверка существующей записи (в базе или раньше в этой же пачке)
+            prev = batch.get(slug)
+            existing = prev is not None or slug in existing_slugs
             
             if existing and not update_existing:
-                print(f"  [SKIP] {person.get('title')} - уже существует")
+                if VERBOSE:
+                    print(f"  [SKIP] {person.get('title')} - уже существует")
                 stats['skipped'] += 1
                 continue
             
@@ -101,26 +123,54 @@ def import_people_from_json(json_file, dry_run=False, update_existing=False):
                 social_links=person.get('social_links'),
                 timeline_events=person.get('timeline_events'),
                 rating=person.get('rating'),
-                image_url=person.get('image_url')
+                image_url=person.get('image_url'),
+                now_iso=now_iso,
+                ids=ids
             )
             
-            if existing:
-                # Обновление
-                doc['_id'] = existing['_id']  # Сохраняем оригинальный ID
-                db.people.replace_one({'slug': slug}, doc)
-                print(f"  [UPDATE] {person.get('title')}")
-                stats['updated'] += 1
+            if prev is not None:
+                # Повтор в пачке: новый документ встаёт на место операции первого
+                pos, prev_doc = prev
+                if '_id' in prev_doc:
+                    # первый ещё только вставляется — оставляем его ID
+                    doc['_id'] = prev_doc['_id']
+                    ops[pos] = pymongo.InsertOne(doc)
+                else:
+                    doc.pop('_id')
+                    ops[pos] = pymongo.ReplaceOne({'slug': slug}, doc)
+                batch[slug] = (pos, doc)
+                if VERBOSE:
+                    print(f"  [UPDATE] {person.get('title')}")
+            elif existing:
+                # Обновление: без _id, чтобы сохранить оригинальный ID
+                doc.pop('_id')
+                ops.append(pymongo.ReplaceOne({'slug': slug}, doc))
+                batch[slug] = (len(ops) - 1, doc)
+                if VERBOSE:
+                    print(f"  [UPDATE] {person.get('title')}")
             else:
                 # Вставка
-                db.people.insert_one(doc)
-                print(f"  [INSERT] {person.get('title')}")
-                stats['imported'] += 1
+                ops.append(pymongo.InsertOne(doc))
+                batch[slug] = (len(ops) - 1, doc)
+                if VERBOSE:
+                    print(f"  [INSERT] {person.get('title')}")
         
         except Exception as e:
             stats['errors'].append(f"{person.get('title')}: {str(e)}")
             print(f"  [ERROR] {person.get('title')}: {e}")
     
-    client.close()
+    # Все записи — одним bulk_write
+    if ops:
+        try:
+            result = db.people.bulk_write(ops, ordered=False)
+            stats['imported'] = result.inserted_count
+            stats['updated'] = result.matched_count
+        except pymongo.errors.BulkWriteError as e:
+            details = e.details
+            stats['imported'] = details.get('nInserted', 0)
+            stats['updated'] = details.get('nMatched', 0)
+            for err in details.get('writeErrors', []):
+                stats['errors'].append(err.get('errmsg', str(err)))
     
     # Итоги
     print(f"\n{'='*50}")
@@ -19,15 +19,30 @@
 from __future__ import annotations
 
 import argparse
-import json
+import bisect
+import itertools
+import mmap
+import operator
 import os
+import pickle
 import re
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
+from functools import lru_cache
 from datetime import datetime, timezone
 
 import pymongo
+from pymongo.collation import Collation
 
-from utils import DB_NAME, MONGO_URL, create_person_document, normalize_rich_text
+from utils import (
+    DB_NAME,
+    MONGO_URL,
+    create_person_document,
+    json_dumps,
+    json_loads,
+    normalize_rich_text,
+    uuid_batch,
+)
 
 
 # SQL_FILE = "/app/humorbd.sql"
@@ -42,6 +57,10 @@ TV_MAP_FILE = "C:\\Users\\rdp6126443.gmail.com\\humorpedia\\migration\\tv_map.js
 IMAGE_MAP_FILE = "C:\\Users\\rdp6126443.gmail.com\\humorpedia\\migration\\image_mapping.json"
 TAG_MAP_FILE = "C:\\Users\\rdp6126443.gmail.com\\humorpedia\\migration\\\\tag_mapping.json"
 
+# Кэш карты TV: pickle грузится быстрее JSON. Источник — tv_map.json, pickle привязан
+# к его mtime/размеру и пересобирается, если JSON правили
+TV_MAP_CACHE_FILE = os.path.splitext(TV_MAP_FILE)[0] + ".pkl"
+
 
 # Transliteration map for cyrillic -> latin slugs
 TRANSLIT_MAP = {
@@ -52,18 +71,45 @@ TRANSLIT_MAP = {
     'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya'
 }
 
+# Пробел -> "-", точка/запятая убираются, кириллица -> латиница: одним str.translate
+_SLUG_TABLE = str.maketrans({**TRANSLIT_MAP, ' ': '-', '.': '', ',': ''})
+_NON_SLUG_RE = re.compile(r'[^a-z0-9-]')
+_DASHES_RE = re.compile(r'-+')
+
 
+@lru_cache(maxsize=4096)
 def transliterate_slug(text: str) -> str:
     """Convert cyrillic text to latin slug"""
-    slug = text.lower().replace(" ", "-").replace(".", "").replace(",", "")
-    slug = ''.join(TRANSLIT_MAP.get(char, char) for char in slug)
-    # Remove non-alphanumeric characters except dashes
-    slug = re.sub(r'[^a-z0-9-]', '', slug)
-    # Remove consecutive dashes
-    slug = re.sub(r'-+', '-', slug)
+    slug = text.lower().translate(_SLUG_TABLE)
+    # После translate обычно остаются только [a-z0-9-] без "--" — тогда обе regex-чистки
+    # ничего не меняют и их можно пропустить
+    if not (slug.isascii() and slug.replace('-', '').isalnum() and '--' not in slug):
+        # Remove non-alphanumeric characters except dashes
+        slug = _NON_SLUG_RE.sub('', slug)
+        # Remove consecutive dashes
+        slug = _DASHES_RE.sub('-', slug)
     return slug.strip('-')
 
 
+# Сравнение имён тегов без учёта регистра (вместо $regex ^...$ с опцией i)
+TAG_NAME_COLLATION = Collation(locale="ru", strength=2)
+
+
+def ensure_tag_name_index(db) -> None:
+    """Индекс tags.name с той же collation — иначе запрос с collation идёт сканом коллекции.
+
+    Backend уже держит обычный уникальный name_1, поэтому у этого индекса своё имя.
+    """
+    try:
+        db.tags.create_index(
+            [("name", pymongo.ASCENDING)], name="name_ci", unique=True, collation=TAG_NAME_COLLATION
+        )
+    except pymongo.errors.OperationFailure as e:
+        # в базе уже есть теги, отличающиеся только регистром — уникальность не навесить
+        print(f"⚠️  Не удалось создать уникальный индекс tags.name_ci: {e}")
+        db.tags.create_index([("name", pymongo.ASCENDING)], name="name_ci", collation=TAG_NAME_COLLATION)
+
+
 def sync_tags_to_collection(tags: list[str], db) -> None:
     """
     Синхронная версия TagService.sync_tags().
@@ -79,9 +125,7 @@ def sync_tags_to_collection(tags: list[str], db) -> None:
             continue
         
         # Check if tag already exists (case-insensitive)
-        existing = db.tags.find_one({
-            "name": {"$regex": f"^{re.escape(tag_name)}$", "$options": "i"}
-        })
+        existing = db.tags.find_one({"name": tag_name}, collation=TAG_NAME_COLLATION)
         
         if not existing:
             # Create new tag
@@ -107,56 +151,61 @@ def sync_tags_to_collection(tags: list[str], db) -> None:
 
 # --------- parsing helpers ---------
 
+def _values_body(blob: str) -> str | None:
+    """"... VALUES (...),(...);" -> содержимое после VALUES без завершающего ";".
+
+    Блоб уже обрезан по концу INSERT, так что хватает find/rfind — без regex
+    с жадным (.*) по всему многомегабайтному INSERT и откатом к ";".
+    """
+    i = blob.find("VALUES")
+    if i < 0:
+        return None
+    body = blob.rstrip()
+    if not body.endswith(";") or len(body) - 1 < i + 6:
+        return None
+    return body[i + 6:-1].lstrip()
+
+# Токены VALUES: строка в кавычках (незакрытая — до конца), backslash-экранирование,
+# скобка/запятая или «прочий» текст. Весь внутренний цикл идёт в C-движке re.
+_ROW_TOKEN_RE = re.compile(r"'(?:[^'\\]+|\\.?)*(?:'|\Z)|\\.?|[(),]|[^'(),\\]+", re.DOTALL)
+
+# Токены одного ряда: (содержимое строки без кавычек, прочий текст, запятая)
+_FIELD_TOKEN_RE = re.compile(r"'((?:[^'\\]+|\\.?)*)(?:'|\Z)|(\\.?|[^',\\]+)|(,)", re.DOTALL)
+
+
 def _split_rows(values_str: str) -> list[str]:
     """Разбивает VALUES (...) , (...) на список строк-рядов без внешних скобок.
 
     Работает устойчивее чем regex split, потому что учитывает кавычки и экранирование.
     """
     rows: list[str] = []
-    current = ""
-    in_quotes = False
-    escape_next = False
+    current: list[str] = []
     paren_depth = 0
 
-    for ch in values_str:
-        if escape_next:
-            current += ch
-            escape_next = False
-            continue
-
-        if ch == "\\":
-            current += ch
-            escape_next = True
-            continue
+    for tok in _ROW_TOKEN_RE.findall(values_str):
+        if tok == "(":
+            paren_depth += 1
+        elif tok == ")":
+            paren_depth -= 1
+
+            # конец ряда: парсинг INSERT обычно "(...),(...)" (без вложенных скобок)
+            if paren_depth == -1:
+                rows.append("".join(current))
+                current = []
+                paren_depth = 0
+                continue
 
-        if ch == "'":
-            in_quotes = not in_quotes
-            current += ch
+        # разделитель между рядами
+        elif tok == "," and paren_depth == 0 and current:
+            rows.append("".join(current))
+            current = []
             continue
 
-        if not in_quotes:
-            if ch == "(":
-                paren_depth += 1
-            elif ch == ")":
-                paren_depth -= 1
-
-                # конец ряда: парсинг INSERT обычно "(...),(...)" (без вложенных скобок)
-                if paren_depth == -1:
-                    rows.append(current)
-                    current = ""
-                    paren_depth = 0
-                    continue
-
-            # разделитель между рядами
-            if ch == "," and paren_depth == 0 and current:
-                rows.append(current)
-                current = ""
-                continue
-
-        current += ch
+        current.append(tok)
 
-    if current.strip():
-        rows.append(current)
+    tail = "".join(current)
+    if tail.strip():
+        rows.append(tail)
 
     # чистим возможные внешние скобки
     cleaned = []
@@ -171,67 +220,162 @@ def _split_rows(values_str: str) -> list[str]:
     return cleaned
 
 
+def _field_value(raw: str) -> str | None:
+    v = raw.strip()
+    return None if v.upper() == "NULL" else v
+
+
 def _split_fields(row_str: str) -> list[str | None]:
     """Разделение SQL tuple на поля (учитывая кавычки и backslash)."""
     fields: list[str | None] = []
-    cur = ""
-    in_quotes = False
-    escape_next = False
-
-    i = 0
-    while i < len(row_str):
-        ch = row_str[i]
-
-        if escape_next:
-            cur += ch
-            escape_next = False
-            i += 1
-            continue
+    cur: list[str] = []
 
-        if ch == "\\":
-            cur += ch
-            escape_next = True
-            i += 1
-            continue
+    for quoted, plain, comma in _FIELD_TOKEN_RE.findall(row_str):
+        if comma:
+            fields.append(_field_value("".join(cur)))
+            cur = []
+        else:
+            cur.append(quoted or plain)
 
-        if ch == "'":
-            in_quotes = not in_quotes
-            i += 1
-            continue
+    fields.append(_field_value("".join(cur)))
+    return fields
 
-        if ch == "," and not in_quotes:
-            v = cur.strip()
-            if v.upper() == "NULL":
-                fields.append(None)
-            else:
-                fields.append(v)
-            cur = ""
-            i += 1
-            while i < len(row_str) and row_str[i] == " ":
-                i += 1
+
+# \\ -> \ и \' -> ' за один проход (остальные escape-последовательности не трогаем)
+_SQL_UNESCAPE_RE = re.compile(r"\\([\\'])")
+
+
+def _unescape_sql_string(value: str) -> str:
+    # базовое "MySQL dump" экранирование
+    return _SQL_UNESCAPE_RE.sub(r"\1", value)
+
+
+# \" -> " и \/ -> / за один проход
+_UNESCAPE_MIGX_RE = re.compile(r'\\(["/])')
+_RAW_NEWLINE_RE = re.compile(r"\r\n?|\n")
+
+
+# --------- dump scanning ---------
+
+# INSERT в дампе всегда начинается с новой строки, а внутри строковых значений
+# переводы строк экранированы — поэтому реальный перевод строки после ";" конец INSERT
+_INSERT_MARKER = b"INSERT INTO `"
+_STATEMENT_END_RE = re.compile(rb";[^\S\n]*(?:\n|\Z)")
+
+
+def _mmap_sql(path: str | None = None) -> mmap.mmap:
+    """Read-only mmap SQL-дампа (используется как контекстный менеджер)."""
+    with open(path or SQL_FILE, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _iter_insert_spans(sql_content, tables):
+    """Идёт по дампу (bytes/mmap) прыжками bytes.find и отдаёт (table, start, end)
+    только для INSERT INTO нужных таблиц, в порядке следования в файле.
+    """
+    wanted = {t.encode(): t for t in tables}
+
+    pos = sql_content.find(_INSERT_MARKER)
+    while pos >= 0:
+        name_start = pos + len(_INSERT_MARKER)
+        name_end = sql_content.find(b"`", name_start)
+        at_line_start = pos == 0 or sql_content[pos - 1] == 0x0A  # b"\n"
+        table = wanted.get(sql_content[name_start:name_end]) if at_line_start and name_end >= 0 else None
+        if table is None:
+            pos = sql_content.find(_INSERT_MARKER, name_start)
             continue
 
-        cur += ch
-        i += 1
+        end = _STATEMENT_END_RE.search(sql_content, name_end)
+        if not end:
+            return
+        yield table, pos, end.end()
+        pos = sql_content.find(_INSERT_MARKER, end.end())
+
 
-    v = cur.strip()
-    if v.upper() == "NULL":
-        fields.append(None)
-    else:
-        fields.append(v)
+def _iter_insert_blobs(sql_content, tables):
+    """Как _iter_insert_spans, но отдаёт (table, insert_str).
 
-    return fields
+    Декодируются только найденные INSERT-ы, а не весь файл.
+    """
+    for table, start, end in _iter_insert_spans(sql_content, tables):
+        yield table, sql_content[start:end].decode("utf-8", "replace")
 
 
-def _unescape_sql_string(value: str) -> str:
-    # базовое "MySQL dump" экранирование
-    # важно: сначала двойные \\\\ -> \\, затем \\' -> '
-    return value.replace("\\\\", "\\").replace("\\'", "'")
+# --------- offset index ---------
+
+# Индекс INSERT-ов: для каждой таблицы [(min_id, max_id, start, end), ...],
+# где id — modx_site_content.id или tmplvar_contentvalues.contentid.
+# Хранится рядом с дампом и пересобирается при изменении mtime/размера дампа.
+OFFSET_INDEX_VERSION = 1
+
+# Первый ряд идёт после "VALUES", остальные — после "),"; совпадения внутри
+# строковых значений только расширяют диапазон, поэтому индекс остаётся корректным
+_INDEXED_ROW_ID_RES = {
+    "modx_site_content": re.compile(rb"(?:VALUES|\),)\s*\(\s*(\d+)\s*,"),
+    "modx_site_tmplvar_contentvalues": re.compile(rb"(?:VALUES|\),)\s*\(\s*\d+\s*,\s*\d+\s*,\s*(\d+)\s*,"),
+}
+
+
+def _offset_index_path(sql_path: str) -> str:
+    return sql_path + ".idx"
+
+
+def _build_offset_index(sql_content) -> dict[str, list[tuple[int, int, int, int]]]:
+    """Один проход по дампу: диапазоны id для каждого INSERT индексируемых таблиц."""
+    index: dict[str, list[tuple[int, int, int, int]]] = {t: [] for t in _INDEXED_ROW_ID_RES}
+    for table, start, end in _iter_insert_spans(sql_content, _INDEXED_ROW_ID_RES):
+        ids = [int(m.group(1)) for m in _INDEXED_ROW_ID_RES[table].finditer(sql_content, start, end)]
+        if ids:
+            index[table].append((min(ids), max(ids), start, end))
+        else:
+            # не смогли прочитать id — такой INSERT разбираем всегда
+            index[table].append((float("-inf"), float("inf"), start, end))
+    return index
+
+
+def _load_offset_index(sql_content, sql_path: str | None = None):
+    """Индекс из файла <дамп>.idx; строится (и сохраняется), если его нет или дамп изменился."""
+    sql_path = sql_path or SQL_FILE
+    st = os.stat(sql_path)
+    key = (OFFSET_INDEX_VERSION, st.st_mtime, st.st_size)
+    idx_path = _offset_index_path(sql_path)
+
+    try:
+        with open(idx_path, "rb") as f:
+            cached = pickle.load(f)
+        if cached.get("key") == key:
+            return cached["tables"]
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError):
+        pass
+
+    tables = _build_offset_index(sql_content)
+    try:
+        with open(idx_path, "wb") as f:
+            pickle.dump({"key": key, "tables": tables}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError as e:
+        print(f"[WARN] Не удалось сохранить индекс {idx_path}: {e}")
+    return tables
+
+
+def _iter_indexed_blobs(sql_content, index, target_ids: set[int]):
+    """(table, insert_str) только для INSERT-ов, чей диапазон id задевает target_ids."""
+    ids = sorted(target_ids)
+    spans = []
+    for table, entries in index.items():
+        for lo, hi, start, end in entries:
+            j = bisect.bisect_left(ids, lo)
+            if j < len(ids) and ids[j] <= hi:
+                spans.append((start, end, table))
+
+    # в порядке файла — как при полном проходе
+    for start, end, table in sorted(spans):
+        yield table, sql_content[start:end].decode("utf-8", "replace")
 
 
 # --------- data extraction ---------
 
-@dataclass
+# slots (Python 3.10+, backend собирается на 3.11): без __dict__ на каждую строку
+@dataclass(slots=True, frozen=True)
 class SiteContentRow:
     id: int
     pagetitle: str
@@ -243,34 +387,46 @@ class SiteContentRow:
     votes: int
 
 
+def _tv_map_key():
+    st = os.stat(TV_MAP_FILE)
+    return (st.st_mtime, st.st_size)
+
+
+def _save_tv_map_cache(tv_map: dict[str, str]) -> None:
+    try:
+        with open(TV_MAP_CACHE_FILE, "wb") as f:
+            pickle.dump({"key": _tv_map_key(), "tv_map": tv_map}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError as e:
+        print(f"[WARN] Не удалось сохранить кэш {TV_MAP_CACHE_FILE}: {e}")
+
+
+@lru_cache(maxsize=1)
 def _load_tv_map() -> dict[str, str]:
+    """tv_id -> tv_name. Результат общий на процесс — не изменять."""
     if os.path.exists(TV_MAP_FILE):
-        with open(TV_MAP_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
+        try:
+            with open(TV_MAP_CACHE_FILE, "rb") as f:
+                cached = pickle.load(f)
+            if isinstance(cached, dict) and cached.get("key") == _tv_map_key():
+                return cached["tv_map"]
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError):
+            pass
+
+        with open(TV_MAP_FILE, "rb") as f:
+            tv_map = json_loads(f.read())
+        _save_tv_map_cache(tv_map)
+        return tv_map
 
     # строим карту из единственного INSERT `modx_site_tmplvars`
     tv_map: dict[str, str] = {}
-    insert_started = False
-    buf: list[str] = []
-
-    with open(SQL_FILE, "r", encoding="utf-8", errors="replace") as f:
-        for line in f:
-            if not insert_started:
-                if "INSERT INTO `modx_site_tmplvars`" in line:
-                    insert_started = True
-                    buf.append(line)
-                continue
 
-            buf.append(line)
-            if line.strip().endswith(";"):
-                break
+    with _mmap_sql() as mm:
+        blob = next((b for _, b in _iter_insert_blobs(mm, ("modx_site_tmplvars",))), "")
 
-    blob = "".join(buf)
-    m = re.search(r"VALUES\s*(.*);\s*$", blob, flags=re.DOTALL)
-    if not m:
+    values_str = _values_body(blob)
+    if values_str is None:
         raise RuntimeError("Не удалось найти VALUES в modx_site_tmplvars")
 
-    values_str = m.group(1)
     rows = _split_rows(values_str)
 
     # поля tmplvars: (id, source, property_preprocess, type, name, caption, ...)
@@ -282,16 +438,19 @@ def _load_tv_map() -> dict[str, str]:
             tv_map[tv_id] = tv_name
 
     with open(TV_MAP_FILE, "w", encoding="utf-8") as f:
-        json.dump(tv_map, f, ensure_ascii=False, indent=2)
+        f.write(json_dumps(tv_map, indent=True))
+    _save_tv_map_cache(tv_map)
 
     return tv_map
 
 
+@lru_cache(maxsize=1)
 def _load_image_map() -> dict[str, str]:
+    """Маппинг путей картинок. Результат общий на процесс — не изменять."""
     if not os.path.exists(IMAGE_MAP_FILE):
         return {}
-    with open(IMAGE_MAP_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    with open(IMAGE_MAP_FILE, "rb") as f:
+        return json_loads(f.read())
 
 
 def _load_tag_map():
@@ -300,8 +459,8 @@ def _load_tag_map():
         print(f"⚠️  Tag mapping file not found: {TAG_MAP_FILE}")
         return {}
     
-    with open(TAG_MAP_FILE, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    with open(TAG_MAP_FILE, 'rb') as f:
+        return json_loads(f.read())
 
 
 def _tags_from_tv(tv_tags_str: str, tag_map: dict) -> list[str]:
@@ -320,21 +479,35 @@ def _tags_from_tv(tv_tags_str: str, tag_map: dict) -> list[str]:
     return tag_names
 
 
-def _extract_for_ids(target_ids: set[int]):
-    """Сканирует humorbd.sql и собирает site_content + tv_values только для target_ids."""
+# Начало ряда из чисел: id (site_content) и id,tmplvarid,contentid (tmplvar_contentvalues).
+# Позволяет отбросить ряд чужого id, не разбирая его поля целиком.
+_ROW_ID_RE = re.compile(r"\s*(\d+)\s*,")
+_TV_ROW_HEAD_RE = re.compile(r"\s*\d+\s*,\s*\d+\s*,\s*(\d+)\s*,")
 
-    site_content: dict[int, SiteContentRow] = {}
-    tv_values: dict[int, dict[str, str]] = {i: {} for i in target_ids}
 
-    in_sc = False
-    in_tv = False
-    buf: list[str] = []
+def _sfield(parts: list[str | None], idx: int) -> str:
+    """Строковое поле ряда по индексу (с unescape); "" если поля нет или NULL."""
+    v = parts[idx] if idx < len(parts) else ""
+    return _unescape_sql_string(v) if isinstance(v, str) else ""
+
+
+def _extract_for_ids(target_ids: set[int], tv_map: dict[str, str] | None = None):
+    """Сканирует humorbd.sql и собирает site_content + tv_values только для target_ids.
+
+    По умолчанию tv_values[id] ключуется tmplvarid. Если передан tv_map, ключи сразу
+    заменяются на имена TV (TV без имени в карте отбрасываются) — как ждёт build_person_doc.
+    """
+
+    site_content: dict[int, SiteContentRow] = {}
+    # плоский список (contentid, tmplvarid, value) вместо заранее созданного dict на каждый id:
+    # у большинства id TV нет, а сгруппировать проще один раз в конце
+    tv_rows: list[tuple[int, str, str]] = []
 
     def flush_site_content(insert_blob: str):
-        m = re.search(r"VALUES\s*(.*);\s*$", insert_blob, flags=re.DOTALL)
-        if not m:
+        values_str = _values_body(insert_blob)
+        if values_str is None:
             return
-        rows = _split_rows(m.group(1))
+        rows = _split_rows(values_str)
 
         # В humorbd.sql структура modx_site_content отличается: в конце есть old_id, keywords, popular, rating, votes.
         # При этом количество колонок может быть 49 (индексы 0..48). В таком случае votes отсутствует.
@@ -344,6 +517,10 @@ def _extract_for_ids(target_ids: set[int]):
         #  - rating: 47 (иногда бывает 12 и т.п. — потом нормализуем)
         #  - votes: 48 (если есть)
         for r in rows:
+            head = _ROW_ID_RE.match(r)
+            if head and int(head.group(1)) not in target_ids:
+                continue
+
             parts = _split_fields(r)
             if not parts or parts[0] is None:
                 continue
@@ -354,11 +531,7 @@ def _extract_for_ids(target_ids: set[int]):
             if rid not in target_ids:
                 continue
 
-            def s(idx: int) -> str:
-                v = parts[idx] if idx < len(parts) else ""
-                return _unescape_sql_string(v) if isinstance(v, str) else ""
-
-            keywords = s(45)
+            keywords = _sfield(parts, 45)
 
             # rating/votes: индексы зависят от длины строки
             rating_idx = 47 if len(parts) > 47 else None
@@ -376,23 +549,27 @@ def _extract_for_ids(target_ids: set[int]):
 
             site_content[rid] = SiteContentRow(
                 id=rid,
-                pagetitle=s(3),
-                longtitle=s(4),
-                description=s(5),
-                alias=s(6),
+                pagetitle=_sfield(parts, 3),
+                longtitle=_sfield(parts, 4),
+                description=_sfield(parts, 5),
+                alias=_sfield(parts, 6),
                 keywords=keywords,
                 rating=rating,
                 votes=votes,
             )
 
     def flush_tv(insert_blob: str):
-        m = re.search(r"VALUES\s*(.*);\s*$", insert_blob, flags=re.DOTALL)
-        if not m:
+        values_str = _values_body(insert_blob)
+        if values_str is None:
             return
-        rows = _split_rows(m.group(1))
+        rows = _split_rows(values_str)
 
         # (id, tmplvarid, contentid, value)
         for r in rows:
+            head = _TV_ROW_HEAD_RE.match(r)
+            if head and int(head.group(1)) not in target_ids:
+                continue
+
             parts = _split_fields(r)
             if len(parts) < 4:
                 continue
@@ -406,76 +583,65 @@ def _extract_for_ids(target_ids: set[int]):
                 continue
 
             tmplvarid = str(parts[1]).strip() if parts[1] is not None else ""
-            raw_val = parts[3] if isinstance(parts[3], str) else ""
-            tv_values[contentid][tmplvarid] = _unescape_sql_string(raw_val)
-
-    with open(SQL_FILE, "r", encoding="utf-8", errors="replace") as f:
-        for line in f:
-            if not in_sc and not in_tv:
-                if line.startswith("INSERT INTO `modx_site_content`"):
-                    in_sc = True
-                    buf = [line]
-                    if line.strip().endswith(";"):
-                        flush_site_content(line)
-                        in_sc = False
-                        buf = []
+            if tv_map is not None:
+                tmplvarid = tv_map.get(tmplvarid)
+                if not tmplvarid:
                     continue
+            raw_val = parts[3] if isinstance(parts[3], str) else ""
+            tv_rows.append((contentid, tmplvarid, _unescape_sql_string(raw_val)))
 
-                if line.startswith("INSERT INTO `modx_site_tmplvar_contentvalues`"):
-                    in_tv = True
-                    buf = [line]
-                    if line.strip().endswith(";"):
-                        flush_tv(line)
-                        in_tv = False
-                        buf = []
-                    continue
-
-            if in_sc:
-                buf.append(line)
-                if line.strip().endswith(";"):
-                    flush_site_content("".join(buf))
-                    in_sc = False
-                    buf = []
-                continue
-
-            if in_tv:
-                buf.append(line)
-                if line.strip().endswith(";"):
-                    flush_tv("".join(buf))
-                    in_tv = False
-                    buf = []
-                continue
+    flush = {
+        "modx_site_content": flush_site_content,
+        "modx_site_tmplvar_contentvalues": flush_tv,
+    }
+    with _mmap_sql() as mm:
+        index = _load_offset_index(mm)
+        for table, insert_blob in _iter_indexed_blobs(mm, index, target_ids):
+            flush[table](insert_blob)
+
+    # сортировка стабильная: при повторе tmplvarid побеждает последнее значение в дампе, как раньше
+    by_content = operator.itemgetter(0)
+    tv_rows.sort(key=by_content)
+    tv_values: dict[int, dict[str, str]] = {
+        cid: {tid: v for _, tid, v in grp} for cid, grp in itertools.groupby(tv_rows, key=by_content)
+    }
 
     return site_content, tv_values
 
 
 # --------- MIGX / timeline parsing ---------
 
+_RU_MONTHS = {
+    "января": 1,
+    "февраля": 2,
+    "марта": 3,
+    "апреля": 4,
+    "мая": 5,
+    "июня": 6,
+    "июля": 7,
+    "августа": 8,
+    "сентября": 9,
+    "октября": 10,
+    "ноября": 11,
+    "декабря": 12,
+}
+_RU_DATE_RE = re.compile(r"(\d{1,2})\s+([а-яё]+)\s+(\d{4})", re.IGNORECASE)
+_HTML_TAG_RE = re.compile(r"<[^>]+>")
+
+# label -> скомпилированный паттерн ячейки таблицы (заполняется лениво)
+_TD_CELL_RE_CACHE: dict[str, re.Pattern] = {}
+
+
 def _parse_ru_date(date_str: str) -> str | None:
     if not date_str:
         return None
     date_str = normalize_rich_text(date_str)
 
-    months = {
-        "января": 1,
-        "февраля": 2,
-        "марта": 3,
-        "апреля": 4,
-        "мая": 5,
-        "июня": 6,
-        "июля": 7,
-        "августа": 8,
-        "сентября": 9,
-        "октября": 10,
-        "ноября": 11,
-        "декабря": 12,
-    }
-
-    m = re.search(r"(\d{1,2})\s+([а-яё]+)\s+(\d{4})", date_str, flags=re.IGNORECASE)
+    m = _RU_DATE_RE.search(date_str)
     if not m:
         return None
     day = int(m.group(1))
-    month = months.get(m.group(2).lower())
+    month = _RU_MONTHS.get(m.group(2).lower())
     year = int(m.group(3))
     if not month:
         return None
@@ -490,14 +656,18 @@ def _parse_table_birth(html: str) -> tuple[str | None, str | None]:
 
     def find_cell(label: str) -> str | None:
         # <td>Дата рождения</td><td>...</td>
-        m = re.search(
-            rf"<td>\s*{re.escape(label)}\s*</td>\s*<td>(.*?)</td>",
-            h,
-            flags=re.IGNORECASE | re.DOTALL,
-        )
+        pattern = _TD_CELL_RE_CACHE.get(label)
+        if pattern is None:
+            # вместо (.*?): символ либо не "<", либо "<" не перед "/td>" —
+            # захват не может перешагнуть закрывающий тег, откатываться некуда
+            pattern = _TD_CELL_RE_CACHE[label] = re.compile(
+                rf"<td>\s*{re.escape(label)}\s*</td>\s*<td>((?:[^<]|<(?!/td>))*)</td>",
+                re.IGNORECASE | re.DOTALL,
+            )
+        m = pattern.search(h)
         if not m:
             return None
-        v = re.sub(r"<[^>]+>", "", m.group(1))
+        v = _HTML_TAG_RE.sub("", m.group(1))
         v = normalize_rich_text(v)
         return v
 
@@ -517,41 +687,44 @@ def _parse_migx(value: str) -> list[dict]:
     if not value:
         return []
 
-    raw = value
-
     # Если внутри TV оказались реальные переводы строк, JSON их не любит
-    raw = raw.replace("\r\n", "\\n").replace("\r", "\\n").replace("\n", "\\n")
+    raw = _RAW_NEWLINE_RE.sub(r"\\n", value)
 
     # Снимаем один уровень экранирования, если похоже на "[{\"...".
     stripped = raw.lstrip()
     if stripped.startswith('[{\\"') or stripped.startswith('{\\"'):
-        raw = raw.replace('\\"', '"').replace('\\/', '/')
+        raw = _UNESCAPE_MIGX_RE.sub(r"\1", raw)
+        stripped = raw.lstrip()
 
-    # Теперь пробуем распарсить
-    try:
-        data = json.loads(raw)
-    except Exception:
+    # Список секций — это "[...]", либо он же, сохранённый строкой JSON: "\"[...]\"".
+    # Всё остальное заведомо не список — не тратим время на разбор.
+    if stripped[:1] not in ('[', '"'):
         return []
 
-    # Иногда хранится как строка JSON внутри JSON
-    if isinstance(data, str):
-        try:
-            data2 = json.loads(data)
-            if isinstance(data2, list):
-                return data2
-        except Exception:
-            return []
+    try:
+        data = json_loads(raw)
+        # Иногда хранится как строка JSON внутри JSON
+        if isinstance(data, str):
+            data = json_loads(data)
+    except ValueError:
+        return []
 
     return data if isinstance(data, list) else []
 
 
+# (date, name, value) имена TV для 14 слотов таймлайна: timeline-block-date, ...-date2, ..., -date14
+_TL_KEYS = [
+    tuple(f"timeline-block-{part}{'' if i == 1 else i}" for part in ("date", "name", "value"))
+    for i in range(1, 15)
+]
+
+
 def _timeline_from_tv_named(tv_named: dict[str, str]) -> list[dict]:
     events = []
-    for i in range(1, 15):
-        suf = "" if i == 1 else str(i)
-        d = tv_named.get(f"timeline-block-date{suf}")
-        n = tv_named.get(f"timeline-block-name{suf}")
-        v = tv_named.get(f"timeline-block-value{suf}")
+    for date_key, name_key, value_key in _TL_KEYS:
+        d = tv_named.get(date_key)
+        n = tv_named.get(name_key)
+        v = tv_named.get(value_key)
         if d and n and v:
             events.append(
                 {
@@ -581,12 +754,12 @@ def _timeline_from_migx_sections(sections: list[dict]) -> list[dict]:
             # НЕЛЬЗЯ делать replace(\\\" -> ") до json.loads — это ломает JSON.
             raw = str(list_triple)
             try:
-                arr = json.loads(raw)
+                arr = json_loads(raw)
             except Exception:
                 # fallback: иногда встречаются реальные CRLF
-                raw = raw.replace("\r\n", "\\n").replace("\r", "\\n").replace("\n", "\\n")
+                raw = _RAW_NEWLINE_RE.sub(r"\\n", raw)
                 try:
-                    arr = json.loads(raw)
+                    arr = json_loads(raw)
                 except Exception:
                     return []
 
@@ -621,9 +794,9 @@ def _social_from_migx_sections(sections: list[dict]) -> dict[str, str]:
             arr = raw
         else:
             s = normalize_rich_text(str(raw))
-            s = s.replace("\\\"", '"').replace("\\/", "/")
+            s = _UNESCAPE_MIGX_RE.sub(r"\1", s)
             try:
-                arr = json.loads(s)
+                arr = json_loads(s)
             except Exception:
                 return {}
 
@@ -682,18 +855,16 @@ def _tags_from_keywords(keywords: str) -> list[str]:
 
 def build_person_doc(
     sc: SiteContentRow,
-    tv_by_id: dict[str, str],
-    tv_map: dict[str, str],
+    tv_named: dict[str, str],
     image_map: dict[str, str],
     tag_map: dict[str, str],
     image_hint: str | None,
+    now_iso: str | None = None,
 ):
-    tv_named = {}
-    for tv_id, val in tv_by_id.items():
-        tv_name = tv_map.get(tv_id)
-        if tv_name:
-            tv_named[tv_name] = val
+    """tv_named: имя TV -> значение (см. _extract_for_ids(..., tv_map=...)).
 
+    now_iso — общая метка created_at/updated_at пачки (по умолчанию — текущее время).
+    """
     # В этом дампе MIGX-страницы людей лежат в TV `config`
     sections = _parse_migx(tv_named.get("config", ""))
 
@@ -732,22 +903,26 @@ def build_person_doc(
     rating = {"average": avg, "count": int(sc.votes or 0)}
 
     # image
+    # Приоритет: image_hint из people_list.json, fallback: TV img из дампа
+    image_src = image_hint or tv_named.get('img')
     image_url = None
+    if image_src:
+        image_src = str(image_src)
+        mapped = image_map.get(image_src)
+        if mapped:
+            image_url = mapped
+            # смэппленный путь тоже может оказаться относительным — ещё один шаг маппинга
+            if not mapped.startswith("/"):
+                image_url = image_map.get(mapped) or f"/media/imported/{mapped.lstrip('/')}"
+        elif image_src.startswith("/"):
+            image_url = image_src
+        else:
+            # маппинга нет (повторно не ищем): считаем, что файл лежит в public/media/imported
+            image_url = f"/media/imported/{image_src.lstrip('/')}"
 
-    # 1) Приоритет: image_hint из people_list.json
-    if image_hint:
-        image_url = image_map.get(image_hint) or image_hint
-
-    # 2) Fallback: TV img из дампа
-    if not image_url:
-        tv_img = tv_named.get('img')
-        if tv_img:
-            image_url = image_map.get(tv_img) or tv_img
-
-    # если путь относительный — сначала пытаемся смэппить через image_mapping,
-    # а если маппинга нет, то считаем, что файл лежит в public/media/imported
-    if image_url and not str(image_url).startswith("/"):
-        image_url = image_map.get(str(image_url)) or f"/media/imported/{str(image_url).lstrip('/')}"
+    # id документа и модулей (до трёх у create_person_document + "Личная жизнь") —
+    # одним чтением urandom на человека
+    ids = iter(uuid_batch(4))
 
     # базовый документ (биография + хронология)
     doc = create_person_document(
@@ -762,6 +937,8 @@ def build_person_doc(
         timeline_events=timeline_events,
         rating=rating,
         image_url=image_url,
+        now_iso=now_iso,
+        ids=ids,
     )
 
     # дополнительный текстовый модуль (например "Личная жизнь")
@@ -771,7 +948,7 @@ def build_person_doc(
         modules.insert(
             1,
             {
-                'id': str(__import__('uuid').uuid4()),
+                'id': next(ids),
                 'type': 'text_block',
                 'order': 2,
                 'title': 'Личная жизнь',
@@ -803,12 +980,65 @@ def build_person_doc(
 
 # --------- import runner ---------
 
+# --------- parallel build ---------
+
+# Меньше этого build_person_doc быстрее сделать в текущем процессе, чем поднимать пул
+PARALLEL_MIN_BATCH = 20
+
+# Функция сборки и справочники воркера: приходят один раз через initializer, а не с каждой задачей
+_pool_fn = None
+_pool_args: tuple = ()
+
+
+def _init_pool_worker(fn, initargs: tuple) -> None:
+    global _pool_fn, _pool_args
+    _pool_fn, _pool_args = fn, initargs
+
+
+def _pool_call(item):
+    return _pool_fn(item, *_pool_args)
+
+
+def build_in_pool(fn, work: list, initargs: tuple, workers: int | None, min_per_worker: int = 1) -> list:
+    """[fn(item, *initargs) for item in work] — в пуле процессов, если пачка того стоит.
+
+    fn должна быть функцией уровня модуля (в воркеры уходит по имени), initargs —
+    общие для всех задач справочники. Порядок результатов совпадает с work.
+    """
+    # Каждый воркер платит за старт и распаковку справочников — не поднимаем больше
+    # процессов, чем len(work) // min_per_worker
+    workers = min(workers or os.cpu_count() or 1, len(work) // min_per_worker)
+    if workers <= 1 or len(work) < PARALLEL_MIN_BATCH:
+        return [fn(item, *initargs) for item in work]
+
+    chunksize = max(1, len(work) // (4 * workers))
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_pool_worker,
+        initargs=(fn, initargs),
+    ) as ex:
+        return list(ex.map(_pool_call, work, chunksize=chunksize))
+
+
+def _build_one(item: tuple[int, SiteContentRow, dict[str, str], str | None], image_map, tag_map, now_iso: str):
+    cid, sc, tv_named, image_hint = item
+    return cid, build_person_doc(sc, tv_named, image_map, tag_map, image_hint, now_iso)
+
+
+def _build_docs(work: list, image_map, tag_map, workers: int | None) -> list[tuple[int, dict]]:
+    """[(cid, sc, tv_named, image_hint)] -> [(cid, doc)] в том же порядке."""
+    # Одна метка времени на весь прогон — и в основном процессе, и в воркерах
+    now_iso = datetime.now(timezone.utc).isoformat()
+    return build_in_pool(_build_one, work, (image_map, tag_map, now_iso), workers)
+
+
 def _pick_from_people_list(limit: int) -> list[dict]:
-    with open(PEOPLE_LIST_FILE, "r", encoding="utf-8") as f:
-        people = json.load(f)
+    with open(PEOPLE_LIST_FILE, "rb") as f:
+        people = json_loads(f.read())
 
-    pending = [p for p in people if p.get("status") == "pending"]
-    return pending[:limit]
+    # останавливаемся на limit-м pending, не фильтруя весь список
+    pending = (p for p in people if p.get("status") == "pending")
+    return list(itertools.islice(pending, limit))
 
 
 def _update_people_list_status(imported_ids: set[int], status: str = "imported"):
@@ -820,8 +1050,8 @@ def _update_people_list_status(imported_ids: set[int], status: str = "imported")
     
     try:
         # Читаем текущий файл
-        with open(PEOPLE_LIST_FILE, "r", encoding="utf-8") as f:
-            people_list = json.load(f)
+        with open(PEOPLE_LIST_FILE, "rb") as f:
+            people_list = json_loads(f.read())
         
         # Обновляем статусы
         updated_count = 0
@@ -834,7 +1064,7 @@ def _update_people_list_status(imported_ids: set[int], status: str = "imported")
         
         # Сохраняем обратно
         with open(PEOPLE_LIST_FILE, "w", encoding="utf-8") as f:
-            json.dump(people_list, f, ensure_ascii=False, indent=2)
+            f.write(json_dumps(people_list, indent=True))
         
         print(f"Обновлено записей в people_list.json: {updated_count}")
         
@@ -850,6 +1080,12 @@ def main():
     parser.add_argument("--apply", action="store_true", help="Записать в MongoDB")
     parser.add_argument("--dry-run", action="store_true", help="Только собрать и показать краткий отчёт (по умолчанию)")
     parser.add_argument("--update", action="store_true", help="Обновлять существующие записи")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help=f"Процессов для сборки документов (по умолчанию: все ядра, если в пачке от {PARALLEL_MIN_BATCH} id)",
+    )
 
     args = parser.parse_args()
 
@@ -870,25 +1106,21 @@ def main():
     image_map = _load_image_map()
     tag_map = _load_tag_map()
 
-    sc_rows, tv_vals = _extract_for_ids(target_ids)
+    sc_rows, tv_vals = _extract_for_ids(target_ids, tv_map=tv_map)
 
     # prepare docs
-    docs = []
+    # id -> image из people_list.json (reversed: при дублях id выигрывает первая запись)
+    img_hint_by_id = {int(p["id"]): p.get("image") for p in reversed(selected)}
+    work = []
     for cid in sorted(target_ids):
         sc = sc_rows.get(cid)
         if not sc:
             print(f"[WARN] site_content не найден для id={cid}")
             continue
 
-        image_hint = None
-        if args.from_list:
-            for p in selected:
-                if int(p["id"]) == cid:
-                    image_hint = p.get("image")
-                    break
+        work.append((cid, sc, tv_vals.get(cid, {}), img_hint_by_id.get(cid)))
 
-        doc = build_person_doc(sc, tv_vals.get(cid, {}), tv_map, image_map, tag_map, image_hint)
-        docs.append((cid, doc))
+    docs = _build_docs(work, image_map, tag_map, args.workers)
 
     print(f"Собрано документов: {len(docs)}")
 
@@ -909,12 +1141,48 @@ def main():
     client = pymongo.MongoClient(MONGO_URL)
     db = client[DB_NAME]
 
-    imported = 0
-    updated = 0
-    imported_ids = set()
+    try:
+        db.people.create_index([("slug", pymongo.ASCENDING)], unique=True)
+    except pymongo.errors.OperationFailure as e:
+        # в коллекции уже есть повторяющиеся slug — импорт идёт и без уникального индекса
+        print(f"⚠️  Не удалось создать уникальный индекс people.slug: {e}")
+    ensure_tag_name_index(db)
+
+    # Один запрос на всю пачку вместо find_one на каждый документ
+    slugs = [doc.get("slug") for _, doc in docs]
+    existing_by_slug = {
+        d["slug"]: d
+        for d in db.people.find({"slug": {"$in": slugs}}, {"slug": 1, "_id": 1, "image": 1})
+    }
+
+    ops = []
+    op_cids = []
+    # slug -> (позиция в ops, документ): повтор slug в пачке ведёт себя как при записи
+    # по одному — пропускается, а с --update заменяет документ своей операции
+    op_by_slug = {}
 
     for cid, doc in docs:
-        existing = db.people.find_one({"slug": doc.get("slug")})
+        slug = doc.get("slug")
+        if slug in op_by_slug:
+            if not args.update:
+                continue
+
+            pos, prev = op_by_slug[slug]
+            if not doc.get('image') and prev.get('image'):
+                doc['image'] = prev.get('image')
+            if doc.get('tags'):
+                sync_tags_to_collection(doc['tags'], db)
+
+            doc["_id"] = prev["_id"]
+            if isinstance(ops[pos], pymongo.InsertOne):
+                ops[pos] = pymongo.InsertOne(doc)
+            else:
+                ops[pos] = pymongo.ReplaceOne({"_id": doc["_id"]}, doc)
+            op_cids[pos] += (cid,)
+            op_by_slug[slug] = (pos, doc)
+            continue
+
+        existing = existing_by_slug.get(slug)
         if existing:
             if not args.update:
                 continue
@@ -928,17 +1196,32 @@ def main():
                 sync_tags_to_collection(doc['tags'], db)
 
             doc["_id"] = existing["_id"]
-            db.people.replace_one({"slug": doc.get("slug")}, doc)
-            updated += 1
-            imported_ids.add(cid)
+            ops.append(pymongo.ReplaceOne({"_id": existing["_id"]}, doc))
         else:
             # Синхронизируем теги при создании
             if doc.get('tags'):
                 sync_tags_to_collection(doc['tags'], db)
-            
-            db.people.insert_one(doc)
-            imported += 1
-            imported_ids.add(cid)
+
+            ops.append(pymongo.InsertOne(doc))
+        op_by_slug[slug] = (len(ops) - 1, doc)
+        op_cids.append((cid,))
+
+    imported = 0
+    updated = 0
+    imported_ids = {cid for cids in op_cids for cid in cids}
+    if ops:
+        try:
+            result = db.people.bulk_write(ops, ordered=False)
+            imported = result.inserted_count
+            updated = result.matched_count
+        except pymongo.errors.BulkWriteError as e:
+            details = e.details
+            imported = details.get("nInserted", 0)
+            updated = details.get("nMatched", 0)
+            for err in details.get("writeErrors", []):
+                print(f"[ERROR] {err.get('errmsg', err)}")
+                # index в writeErrors совпадает с позицией в ops
+                imported_ids.difference_update(op_cids[err["index"]])
 
     client.close()
 
@@ -5,21 +5,41 @@
 import sys
 import os
 import re
-import json
 from datetime import datetime, timezone
 from uuid import uuid4
 
 sys.path.insert(0, '/app/backend')
+# migration/ — раньше backend: иначе `utils` находится как backend/utils
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-import asyncio
-from motor.motor_asyncio import AsyncIOMotorClient
+import pymongo
 from dotenv import load_dotenv
+from utils import json_dumps, json_loads
 
 load_dotenv('/app/backend/.env')
 
 MONGO_URL = os.getenv('MONGO_URL')
 DB_NAME = os.getenv('DB_NAME')
 
+_DATE_RE = re.compile(r'(\d+)\s+(\w+)\s+(\d{4})')
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+# &nbsp;/&mdash;/&ndash; и экранированные \r\n, \n — одной заменой вместо цепочки replace
+_STRIP_HTML_SUBS = {'&nbsp;': ' ', '&mdash;': '—', '&ndash;': '–', '\\r\\n': ' ', '\\n': ' '}
+_STRIP_HTML_SUBS_RE = re.compile(r'&nbsp;|&mdash;|&ndash;|\\r\\n|\\n')
+_VK_RE = re.compile(r'https?://vk\.com/([^`\'"]+)')
+_IG_RE = re.compile(r'https?://[^/]*instagram\.com/([^`\'"]+)')
+_YT_RE = re.compile(r'https?://[^/]*youtube\.com/([^`\'"]+)')
+
+# Одно значение MODX: строка в одинарных кавычках ('' и \x — экранирование)
+# или «голое» значение (число, NULL), за которым идёт запятая или конец строки
+_FIELD_RE = re.compile(r"\s*(?:'((?:[^'\\]+|\\.|'')*)'|([^,]*?))\s*(?:,|$)", re.DOTALL)
+
+# (date, name, value) ключи TV для блоков таймлайна 1..9: timeline-block-date, ...-date2, ...
+_TIMELINE_KEYS = [
+    (f'timeline-block-date{suffix}', f'timeline-block-name{suffix}', f'timeline-block-value{suffix}')
+    for suffix in [''] + [str(i) for i in range(2, 10)]
+]
+
 def parse_date(date_str):
     """Parse Russian date format"""
     if not date_str:
@@ -32,7 +52,7 @@ def parse_date(date_str):
         'сентября': 9, 'октября': 10, 'ноября': 11, 'декабря': 12
     }
     
-    match = re.search(r'(\d+)\s+(\w+)\s+(\d{4})', date_str)
+    match = _DATE_RE.search(date_str)
     if match:
         day = int(match.group(1))
         month_name = match.group(2)
@@ -47,13 +67,11 @@ def strip_html(html):
     if not html:
         return ""
     # Remove HTML tags
-    clean = re.sub(r'<[^>]+>', '', html)
-    # Replace &nbsp; and other entities
-    clean = clean.replace('&nbsp;', ' ').replace('&mdash;', '—').replace('&ndash;', '–')
-    # Remove \r\n and normalize whitespace
-    clean = clean.replace('\\r\\n', ' ').replace('\r\n', ' ').replace('\\n', ' ').replace('\n', ' ')
-    clean = re.sub(r'\s+', ' ', clean).strip()
-    return clean
+    clean = _HTML_TAG_RE.sub('', html)
+    # Replace &nbsp; and other entities, escaped \r\n / \n
+    clean = _STRIP_HTML_SUBS_RE.sub(lambda m: _STRIP_HTML_SUBS[m.group(0)], clean)
+    # Normalize whitespace (real \r\n included)
+    return ' '.join(clean.split())
 
 def extract_social_links(tv_data):
     """Extract social links from TV"""
@@ -61,19 +79,19 @@ def extract_social_links(tv_data):
     
     vk = tv_data.get('table-vk', '')
     if 'vk.com' in vk:
-        match = re.search(r'https?://vk\.com/([^`\'"]+)', vk)
+        match = _VK_RE.search(vk)
         if match:
             links['vk'] = f"https://vk.com/{match.group(1)}"
     
     ig = tv_data.get('table-ig', '')
     if 'instagram.com' in ig:
-        match = re.search(r'https?://[^/]*instagram\.com/([^`\'"]+)', ig)
+        match = _IG_RE.search(ig)
         if match:
             links['instagram'] = f"https://www.instagram.com/{match.group(1).rstrip('/')}"
     
     youtube = tv_data.get('table-youtube', '')
     if 'youtube.com' in youtube:
-        match = re.search(r'https?://[^/]*youtube\.com/([^`\'"]+)', youtube)
+        match = _YT_RE.search(youtube)
         if match:
             links['youtube'] = f"https://www.youtube.com/{match.group(1)}"
     
@@ -84,12 +102,7 @@ def create_timeline_modules(tv_data):
     modules = []
     
     # Find all timeline blocks
-    for i in range(1, 10):
-        suffix = '' if i == 1 else str(i)
-        date_key = f'timeline-block-date{suffix}'
-        name_key = f'timeline-block-name{suffix}'
-        value_key = f'timeline-block-value{suffix}'
-        
+    for date_key, name_key, value_key in _TIMELINE_KEYS:
         if date_key in tv_data and name_key in tv_data and value_key in tv_data:
             date = tv_data[date_key]
             name = tv_data[name_key]
@@ -113,6 +126,10 @@ def create_timeline_modules(tv_data):
 def convert_to_person(modx_record, tv_data, image_mapping=None):
     """Convert MODX + TV data to MongoDB person"""
     
+    # Поля записи, которые нужны по нескольку раз, читаем один раз
+    pagetitle = modx_record.get('pagetitle', '')
+    description = modx_record.get('description', '')
+    
     # Parse dates
     birth_date = parse_date(tv_data.get('table-value2', ''))
     
@@ -157,29 +174,20 @@ def convert_to_person(modx_record, tv_data, image_mapping=None):
     cover_image = None
     img_url = tv_data.get('table-image', '') or tv_data.get('img_seo', '')
     if img_url:
-        # Check mapping
-        if image_mapping and img_url in image_mapping:
-            new_url = image_mapping[img_url]
-            if new_url:
-                cover_image = {
-                    "url": new_url,
-                    "alt": tv_data.get('table-image-tags', '') or modx_record.get('pagetitle', '')
-                }
-        
-        # Fallback to old URL if no mapping
-        if not cover_image:
-            cover_image = {
-                "url": f"https://humorpedia.ru/{img_url}",
-                "alt": tv_data.get('table-image-tags', '') or modx_record.get('pagetitle', '')
-            }
+        # Check mapping; fallback to old URL if no mapping
+        new_url = image_mapping.get(img_url) if image_mapping else None
+        cover_image = {
+            "url": new_url or f"https://humorpedia.ru/{img_url}",
+            "alt": tv_data.get('table-image-tags', '') or pagetitle
+        }
     
     person = {
         "_id": str(uuid4()),
         "old_modx_id": int(modx_record['id']),
-        "full_name": tv_data.get('table-value', '').strip() or modx_record.get('pagetitle', '').strip(),
-        "title": modx_record.get('pagetitle', '').strip(),
+        "full_name": tv_data.get('table-value', '').strip() or pagetitle.strip(),
+        "title": pagetitle.strip(),
         "slug": modx_record.get('alias', '').strip(),
-        "description": modx_record.get('description', '').strip(),
+        "description": description.strip(),
         "bio": "",  # Don't duplicate bio in separate field
         "birth_date": birth_date,
         "birth_place": tv_data.get('table-value3', ''),
@@ -195,22 +203,22 @@ def convert_to_person(modx_record, tv_data, image_mapping=None):
         "created_at": created_at.isoformat(),
         "updated_at": updated_at.isoformat(),
         "seo": {
-            "meta_title": modx_record.get('longtitle', '') or modx_record.get('pagetitle', ''),
-            "meta_description": modx_record.get('description', ''),
+            "meta_title": modx_record.get('longtitle', '') or pagetitle,
+            "meta_description": description,
             "keywords": tags
         }
     }
     
     return person
 
-async def import_person_with_tv():
+def import_person_with_tv():
     """Import person with TV data"""
     
     # Load image mapping
     image_mapping = {}
     try:
-        with open('/app/migration/image_mapping.json', 'r', encoding='utf-8') as f:
-            image_mapping = json.load(f)
+        with open('/app/migration/image_mapping.json', 'rb') as f:
+            image_mapping = json_loads(f.read())
         print(f"✅ Загружен image mapping: {len(image_mapping)} записей\n")
     except FileNotFoundError:
         print("⚠️  Image mapping не найден, будут использованы старые URL\n")
@@ -218,8 +226,8 @@ async def import_person_with_tv():
     # Load ratings
     ratings = {}
     try:
-        with open('/app/migration/ratings.json', 'r', encoding='utf-8') as f:
-            ratings = json.load(f)
+        with open('/app/migration/ratings.json', 'rb') as f:
+            ratings = json_loads(f.read())
         print(f"✅ Загружен ratings: {len(ratings)} записей\n")
     except FileNotFoundError:
         print("⚠️  Ratings не найдены\n")
@@ -238,28 +246,13 @@ async def import_person_with_tv():
     elif line.endswith(')'):
         line = line[:-1]
     
-    # Simple field extraction
-    parts = []
-    current = ""
-    in_quotes = False
-    
-    for char in line:
-        if char == "'" and (not current or current[-1] != '\\'):
-            in_quotes = not in_quotes
-            if not in_quotes:
-                continue
-            elif current and current[-1] != ',':
-                continue
-        
-        if char == ',' and not in_quotes:
-            parts.append(current)
-            current = ""
-            continue
-        
-        current += char
-    
-    if current:
-        parts.append(current)
+    # Field extraction: one compiled tokenizer instead of a per-character loop
+    parts = [
+        m.group(1).replace("''", "'") if m.group(1) is not None else m.group(2).strip()
+        for m in _FIELD_RE.finditer(line)
+        # finditer даёт пустое совпадение в самом конце строки — это не поле
+        if m.start() < len(line)
+    ]
     
     field_names = [
         'id', 'type', 'contentType', 'pagetitle', 'longtitle', 'description',
@@ -279,8 +272,8 @@ async def import_person_with_tv():
             modx_record[name] = parts[i]
     
     # Load TV data
-    with open('/app/migration/person_350_tv_mapped.json', 'r', encoding='utf-8') as f:
-        tv_data = json.load(f)
+    with open('/app/migration/person_350_tv_mapped.json', 'rb') as f:
+        tv_data = json_loads(f.read())
     
     print("\n" + "="*80)
     print("ПРЕОБРАЗОВАНИЕ В MONGODB")
@@ -304,11 +297,12 @@ async def import_person_with_tv():
             'count': 0
         }
     
-    print(json.dumps(person, ensure_ascii=False, indent=2))
+    person_json = json_dumps(person, indent=True)
+    print(person_json)
     
     # Save for review
     with open('/app/migration/person_350_final.json', 'w', encoding='utf-8') as f:
-        json.dump(person, f, ensure_ascii=False, indent=2)
+        f.write(person_json)
     
     print("\n✅ Сохранено в person_350_final.json")
     
@@ -317,20 +311,20 @@ async def import_person_with_tv():
     print("ИМПОРТ В MONGODB")
     print("="*80)
     
-    client = AsyncIOMotorClient(MONGO_URL)
+    client = pymongo.MongoClient(MONGO_URL)
     db = client[DB_NAME]
     
     # Check if exists
-    existing = await db.people.find_one({"old_modx_id": int(modx_record['id'])})
+    existing = db.people.find_one({"old_modx_id": int(modx_record['id'])})
     
     if existing:
         print(f"⚠️  Обновляем существующую запись...")
         person['_id'] = existing['_id']  # Keep existing ID
-        await db.people.replace_one({"_id": existing['_id']}, person)
+        db.people.replace_one({"_id": existing['_id']}, person)
         print(f"✅ ОБНОВЛЕНО!")
         print(f"   ID: {existing['_id']}")
     else:
-        result = await db.people.insert_one(person)
+        result = db.people.insert_one(person)
         print(f"✅ ИМПОРТИРОВАНО!")
         print(f"   ID: {result.inserted_id}")
     
@@ -342,7 +336,7 @@ async def import_person_with_tv():
     print(f"   Соцсети: {list(person['social_links'].keys())}")
     print(f"   Status: {person['status']}")
     
-    await client.close()
+    client.close()
 
 if __name__ == "__main__":
-    asyncio.run(import_person_with_tv())
+    import_person_with_tv()
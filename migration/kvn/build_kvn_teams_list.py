@@ -9,8 +9,6 @@ Usage:
 """
 
 import argparse
-import json
-import re
 import sys
 import os
 
@@ -18,7 +16,45 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Reuse robust SQL tuple parsing from people importer
-from import_people_from_sql import _split_rows, _split_fields, _unescape_sql_string
+from import_people_from_sql import (
+    _iter_insert_blobs,
+    _mmap_sql,
+    _split_fields,
+    _split_rows,
+    _unescape_sql_string,
+    _values_body,
+)
+from utils import json_dumps
+
+
+def _collect_teams(rows: list[str], parent_id: str, results: list[dict]) -> None:
+    """Добавляет в results ряды modx_site_content с заданным parent."""
+    for r in rows:
+        parts = _split_fields(r)
+        if not parts or parts[0] is None:
+            continue
+
+        # parent is at index 12 in this dump
+        if len(parts) <= 12 or str(parts[12]).strip() != parent_id:
+            continue
+
+        try:
+            rid = int(str(parts[0]).strip())
+        except Exception:
+            continue
+
+        def s(idx: int) -> str:
+            v = parts[idx] if idx < len(parts) else ""
+            return _unescape_sql_string(v) if isinstance(v, str) else ""
+
+        results.append(
+            {
+                "id": rid,
+                "title": s(3),
+                "slug": s(6),  # alias is at index 6
+                "status": "pending",
+            }
+        )
 
 
 def main():
@@ -30,64 +66,21 @@ def main():
 
     parent_id = str(args.parent)
 
-    in_sc = False
-    buf = []
     results = []
 
-    with open(args.sql, "r", encoding="utf-8", errors="replace") as f:
-        for line in f:
-            if not in_sc:
-                if line.startswith("INSERT INTO `modx_site_content`"):
-                    in_sc = True
-                    buf = [line]
+    # mmap + поиск INSERT по байтам: декодируем только INSERT-ы `modx_site_content`,
+    # а не весь дамп построчно
+    with _mmap_sql(args.sql) as mm:
+        for _, blob in _iter_insert_blobs(mm, ("modx_site_content",)):
+            values_str = _values_body(blob)
+            if values_str is None:
                 continue
-
-            buf.append(line)
-            if not line.strip().endswith(";"):
-                continue
-
-            blob = "".join(buf)
-            in_sc = False
-            buf = []
-
-            m = re.search(r"VALUES\s*(.*);\s*$", blob, flags=re.DOTALL)
-            if not m:
-                continue
-
-            rows = _split_rows(m.group(1))
-            for r in rows:
-                parts = _split_fields(r)
-                if not parts or parts[0] is None:
-                    continue
-
-                # parent is at index 12 in this dump
-                if len(parts) <= 12 or str(parts[12]).strip() != parent_id:
-                    continue
-
-                try:
-                    rid = int(str(parts[0]).strip())
-                except Exception:
-                    continue
-
-                def s(idx: int) -> str:
-                    v = parts[idx] if idx < len(parts) else ""
-                    return _unescape_sql_string(v) if isinstance(v, str) else ""
-
-                results.append(
-                    {
-                        "id": rid,
-                        "title": s(3),
-                        "slug": s(6),  # alias is at index 6
-                        "status": "pending",
-                    }
-                )
-
-            break
+            _collect_teams(_split_rows(values_str), parent_id, results)
 
     results.sort(key=lambda x: x["id"])
 
     with open(args.out, "w", encoding="utf-8") as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
+        f.write(json_dumps(results, indent=True))
 
     print(f"Saved {len(results)} teams to {args.out}")
 
@@ -21,25 +21,31 @@
 from __future__ import annotations
 
 import argparse
-import json
 import os
 import re
 import sys
+import traceback
+from collections import Counter
 from datetime import datetime, timezone
-from uuid import uuid4
+from functools import lru_cache
+from itertools import islice
 
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import pymongo
 from import_people_from_sql import (
+    PARALLEL_MIN_BATCH,
+    TAG_NAME_COLLATION,
     _extract_for_ids,
     _load_image_map,
     _load_tv_map,
     _parse_migx,
     _timeline_from_migx_sections,
+    build_in_pool,
+    ensure_tag_name_index,
 )
-from utils import DB_NAME, MONGO_URL, normalize_rich_text
+from utils import VERBOSE, get_db, json_dumps, json_loads, normalize_rich_text, uuid_batch
 
 
 SQL_FILE = "C:\\Users\\rdp6126443.gmail.com\\humorpedia\\migration\\humorbd.sql"
@@ -62,15 +68,39 @@ TRANSLIT_MAP = {
     'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya'
 }
 
+# Пробел -> "-", точка/запятая убираются, кириллица -> латиница: одним str.translate
+_SLUG_TABLE = str.maketrans({**TRANSLIT_MAP, ' ': '-', '.': '', ',': ''})
+
+_NON_SLUG_RE = re.compile(r'[^a-z0-9-]')
+_DASHES_RE = re.compile(r'-+')
+# Снятие тегов с ключей фактов. Посимвольный сканер на Python проверяли — в ~3 раза
+# медленнее этой регулярки на типичных ключах (<b>Город</b> и т.п.)
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+# Строка таблицы фактов: первые две ячейки <td> (атрибуты у tr/td допустимы, лишние ячейки
+# пропускаются). Содержимое ячейки — текст без "<" и "<" не перед "/td>": захват не может
+# перешагнуть </td>, поэтому нет ни отката по всему HTML, ни склейки соседних строк.
+# Форма "развёрнутого цикла" [^<]*(?:<...[^<]*)* съедает текст целыми кусками, а не по
+# одному символу через альтернативу — на реальных таблицах в разы быстрее.
+# HTML-парсер (lxml и т.п.) сюда не берём: паттерн и так линейный, а парсер нормализует
+# разметку ячейки, и значения фактов разошлись бы с уже импортированными.
+_TD_INNER = r'[^<]*(?:<(?!/td>)[^<]*)*'
+_FACTS_ROW_RE = re.compile(
+    rf'<tr\b[^>]*>\s*<td\b[^>]*>({_TD_INNER})</td>\s*<td\b[^>]*>({_TD_INNER})</td>'
+    rf'(?:\s*<td\b[^>]*>{_TD_INNER}</td>)*\s*</tr>',
+    re.IGNORECASE,
+)
+
 
+@lru_cache(maxsize=4096)
 def transliterate_slug(text: str) -> str:
     """Convert cyrillic text to latin slug"""
-    slug = text.lower().replace(" ", "-").replace(".", "").replace(",", "")
-    slug = ''.join(TRANSLIT_MAP.get(char, char) for char in slug)
-    # Remove non-alphanumeric characters except dashes
-    slug = re.sub(r'[^a-z0-9-]', '', slug)
-    # Remove consecutive dashes
-    slug = re.sub(r'-+', '-', slug)
+    slug = text.lower().translate(_SLUG_TABLE)
+    # Уже чистый slug ([a-z0-9-] без "--") не гоняем через regex
+    if not (slug.isascii() and slug.replace('-', '').isalnum() and '--' not in slug):
+        # Remove non-alphanumeric characters except dashes
+        slug = _NON_SLUG_RE.sub('', slug)
+        # Remove consecutive dashes
+        slug = _DASHES_RE.sub('-', slug)
     return slug.strip('-')
 
 
@@ -79,41 +109,46 @@ def sync_tags_to_collection(tags: list[str], db) -> None:
     Синхронная версия TagService.sync_tags().
     Создаёт новые теги в коллекции tags, если их нет.
     Увеличивает usage_count для существующих.
+
+    Все теги пачки уходят одним bulk_write: upsert по имени (без учёта регистра),
+    usage_count растёт на число вхождений тега в tags.
     """
-    if not tags:
+    # Варианты одного тега, отличающиеся только регистром, под коллацией — один документ:
+    # складываем их по casefold заранее (имя — первое написание)
+    counts = Counter()
+    names = {}
+    for t in tags or []:
+        t = t.strip()
+        if t:
+            counts[names.setdefault(t.casefold(), t)] += 1
+    if not counts:
         return
-    
-    for tag_name in tags:
-        tag_name = tag_name.strip()
-        if not tag_name:
-            continue
-        
-        # Check if tag already exists (case-insensitive)
-        existing = db.tags.find_one({
-            "name": {"$regex": f"^{re.escape(tag_name)}$", "$options": "i"}
-        })
-        
-        if not existing:
-            # Create new tag
-            tag_doc = {
-                "_id": str(uuid4()),
-                "name": tag_name,
-                "slug": transliterate_slug(tag_name),
-                "old_id": None,
-                "usage_count": 1,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }
-            try:
-                db.tags.insert_one(tag_doc)
-                # print(f"  ✅ Created tag: {tag_name}")
-            except Exception as e:
-                print(f"  ⚠️  Failed to create tag {tag_name}: {e}")
-        else:
-            # Increment usage count
-            db.tags.update_one(
-                {"_id": existing["_id"]},
-                {"$inc": {"usage_count": 1}}
-            )
+
+    now = datetime.now(timezone.utc).isoformat()
+    ids = uuid_batch(len(counts))
+    ops = [
+        pymongo.UpdateOne(
+            {"name": tag_name},
+            {
+                "$inc": {"usage_count": n},
+                "$setOnInsert": {
+                    "_id": tag_id,
+                    "slug": transliterate_slug(tag_name),
+                    "old_id": None,
+                    "created_at": now,
+                },
+            },
+            upsert=True,
+            collation=TAG_NAME_COLLATION,
+        )
+        for (tag_name, n), tag_id in zip(counts.items(), ids)
+    ]
+    try:
+        # ordered=False: ошибка одного тега (например, совпавший slug) не отменяет остальные
+        db.tags.bulk_write(ops, ordered=False)
+    except pymongo.errors.BulkWriteError as e:
+        for err in e.details.get('writeErrors', []):
+            print(f"  ⚠️  Failed to sync tag: {err.get('errmsg', err)}")
 
 
 def _load_tag_map():
@@ -122,8 +157,16 @@ def _load_tag_map():
         print(f"⚠️  Tag mapping file not found: {TAG_MAP_FILE}")
         return {}
     
-    with open(TAG_MAP_FILE, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    with open(TAG_MAP_FILE, 'rb') as f:
+        return json_loads(f.read())
+
+
+def _save_teams_list(teams_list: list[dict]) -> None:
+    """Перезаписывает kvn_teams_list.json атомарно: tmp-файл + os.replace."""
+    tmp_path = KVN_TEAMS_LIST_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(json_dumps(teams_list, indent=True))
+    os.replace(tmp_path, KVN_TEAMS_LIST_FILE)
 
 
 def _tags_from_tv(tv_tags_str: str, tag_map: dict) -> list[str]:
@@ -154,17 +197,28 @@ def create_team_document(
     tags: list[str] = None,
     rating: dict = None,
     social_links: dict = None,
+    now_iso: str = None,
 ):
-    """Создаёт документ команды для MongoDB."""
+    """Создаёт документ команды для MongoDB.
+
+    now_iso — общая метка времени для created_at/updated_at (по умолчанию — сейчас).
+    """
+    if now_iso is None:
+        now_iso = datetime.now(timezone.utc).isoformat()
+    # _id + таймлайн + по одному на текстовый блок: все id одним чтением urandom
+    text_blocks = text_blocks or []
+    ids = iter(uuid_batch(2 + len(text_blocks)))
+    # order модуля — это всегда его позиция в списке (с 1), отдельный счётчик не нужен
     modules = []
-    order = 1
+    add_module = modules.append
+    rest = 0  # с какого текстового блока начинаются «остальные»
 
     # Первый блок - основной текст (без заголовка)
-    if text_blocks and len(text_blocks) > 0 and not text_blocks[0].get('title'):
-        modules.append({
-            'id': str(uuid4()),
+    if text_blocks and not text_blocks[0].get('title'):
+        add_module({
+            'id': next(ids),
             'type': 'text_block',
-            'order': order,
+            'order': len(modules) + 1,
             'title': '',
             'visible': True,
             'data': {
@@ -172,26 +226,29 @@ def create_team_document(
                 'content': normalize_rich_text(text_blocks[0]['content']),
             }
         })
-        order += 1
-        text_blocks = text_blocks[1:]  # Убираем первый блок из списка
+        rest = 1  # первый блок уже взят (без копирования хвоста списка)
 
     # Таймлайн идёт вторым
     if timeline_events:
         normalized_events = []
+        add_event = normalized_events.append
         for ev in timeline_events:
             if not isinstance(ev, dict):
                 continue
-            normalized_events.append({
-                'year': normalize_rich_text(str(ev.get('year', ''))) if ev.get('year') else None,
-                'title': normalize_rich_text(str(ev.get('title', ''))) if ev.get('title') else None,
-                'description': normalize_rich_text(str(ev.get('description', ''))) if ev.get('description') else None,
+            year = ev.get('year')
+            ev_title = ev.get('title')
+            description = ev.get('description')
+            add_event({
+                'year': normalize_rich_text(str(year)) if year else None,
+                'title': normalize_rich_text(str(ev_title)) if ev_title else None,
+                'description': normalize_rich_text(str(description)) if description else None,
             })
 
         if normalized_events:
-            modules.append({
-                'id': str(uuid4()),
+            add_module({
+                'id': next(ids),
                 'type': 'timeline',
-                'order': order,
+                'order': len(modules) + 1,
                 'title': 'Хронология',
                 'visible': True,
                 'data': {
@@ -199,27 +256,26 @@ def create_team_document(
                     'items': normalized_events,
                 }
             })
-            order += 1
 
     # Остальные текстовые блоки (4 стандартных)
-    if text_blocks:
-        for block in text_blocks:
-            if block.get('content'):
-                modules.append({
-                    'id': str(uuid4()),
-                    'type': 'text_block',
-                    'order': order,
-                    'title': block.get('title', 'Без названия'),
-                    'visible': True,
-                    'data': {
-                        'title': block.get('title', 'Без названия'),
-                        'content': normalize_rich_text(block['content']),
-                    }
-                })
-                order += 1
+    for block in islice(text_blocks, rest, None):
+        content = block.get('content')
+        if content:
+            block_title = block.get('title', 'Без названия')
+            add_module({
+                'id': next(ids),
+                'type': 'text_block',
+                'order': len(modules) + 1,
+                'title': block_title,
+                'visible': True,
+                'data': {
+                    'title': block_title,
+                    'content': normalize_rich_text(content),
+                }
+            })
 
     return {
-        '_id': str(uuid4()),
+        '_id': next(ids),
         'content_type': 'team',
         'team_type': 'kvn',
         'title': title,
@@ -227,8 +283,8 @@ def create_team_document(
         'name': name or title,
         'status': 'published',
         'tags': tags or [],
-        'created_at': datetime.now(timezone.utc).isoformat(),
-        'updated_at': datetime.now(timezone.utc).isoformat(),
+        'created_at': now_iso,
+        'updated_at': now_iso,
         'facts': facts or {},
         'social_links': social_links or {},
         'modules': modules,
@@ -248,28 +304,41 @@ def create_team_document(
 
 def _parse_facts_table(table_html: str) -> dict:
     """Извлекает факты из HTML-таблицы."""
-    if not table_html:
+    # Любая строка таблицы содержит закрывающие теги; без "</" (например, обычный
+    # текст вместо таблицы) регулярку можно не запускать. Проверка не зависит от регистра
+    # тегов, в отличие от '<tr' in ...
+    if not table_html or '</' not in table_html:
         return {}
 
-    import re
     facts = {}
     
     # Ищем строки таблицы <tr><td>Key</td><td>Value</td></tr>
-    rows = re.findall(r'<tr>\s*<td>(.*?)</td>\s*<td>(.*?)</td>\s*</tr>', table_html, re.IGNORECASE | re.DOTALL)
-    
-    for key_html, val_html in rows:
-        # Убираем теги
-        key = re.sub(r'<[^>]+>', '', key_html).strip()
+    for key_html, val_html in _FACTS_ROW_RE.findall(table_html):
+        # Убираем теги (только если они есть)
+        key = (_HTML_TAG_RE.sub('', key_html) if '<' in key_html else key_html).strip()
+        if not key:
+            # Без ключа факт не нужен — значение не нормализуем зря
+            continue
         val = normalize_rich_text(val_html)
         
-        if key and val:
+        if val:
             facts[key] = val
     
     return facts
 
 
-def build_team_doc(sc, tv_by_id: dict[str, str], tv_map: dict[str, str], image_map: dict[str, str], tag_map: dict[str, str]):
-    """Строит документ команды из данных SQL."""
+def build_team_doc(
+    sc,
+    tv_by_id: dict[str, str],
+    tv_map: dict[str, str],
+    image_map: dict[str, str],
+    tag_map: dict[str, str],
+    now_iso: str = None,
+):
+    """Строит документ команды из данных SQL.
+
+    now_iso — общая метка времени прогона (см. create_team_document).
+    """
     tv_named = {}
     for tv_id, val in tv_by_id.items():
         tv_name = tv_map.get(tv_id)
@@ -279,37 +348,52 @@ def build_team_doc(sc, tv_by_id: dict[str, str], tv_map: dict[str, str], image_m
     # Parse MIGX
     sections = _parse_migx(tv_named.get("config", ""))
 
-    # Извлекаем таблицу фактов из секции "info"
-    facts = {}
-    main_content = ""
-    for sec in sections:
-        if sec.get("MIGX_formname") == "info":
-            table_html = sec.get("table", "")
-            facts = _parse_facts_table(table_html)
-            # subtitle обычно содержит основной текст о команде
-            main_content = sec.get("subtitle", "")
-            break
-
-    # Извлекаем текстовые блоки
-    all_text_sections = []
+    # Один проход по секциям: первая "info" (факты + основной текст), первая "table"
+    # (таблица игр), "timeline" — кандидаты для таймлайна, а "text" сразу раскладываем
+    # по категориям стандартных блоков.
+    # Проверки категорий независимые (не elif): блок с "Состав" и "История" в заголовке
+    # попадает в обе. Для Состава/проектов/игр берётся первый подходящий блок,
+    # История — все (копим тексты, чтобы склеить их одним join).
+    info_sec = games_sec = None
+    sostav = projects_content = games_content = None
+    history_parts = []
+    timeline_secs = []
     for sec in sections:
-        if sec.get("MIGX_formname") == "text":
-            title = sec.get("section_name", "")
+        formname = sec.get("MIGX_formname")
+        if formname == "text":
             # Контент может быть в 'content' или 'subtitle'
             content = sec.get("content", "") or sec.get("subtitle", "")
-            if content:
-                all_text_sections.append({
-                    'title': title,
-                    'content': content,
-                })
-    
-    # Извлекаем таблицу игр
-    games_table_html = ""
-    for sec in sections:
-        if sec.get("MIGX_formname") == "table":
-            games_table_html = sec.get("content", "")
-            break
-    
+            if not content:
+                continue
+            t = sec.get("section_name", "")
+            if sostav is None and 'Состав' in t:
+                sostav = {'title': t, 'content': content}
+            if 'История' in t:
+                history_parts.append(content)
+            if projects_content is None and 'Сторонние проекты' in t:
+                projects_content = content
+            if games_content is None and 'Список игр' in t:
+                games_content = content
+        elif formname == "info":
+            if info_sec is None:
+                info_sec = sec
+        elif formname == "table":
+            if games_sec is None:
+                games_sec = sec
+        elif formname == "timeline":
+            timeline_secs.append(sec)
+
+    # Извлекаем таблицу фактов из секции "info"
+    facts = {}
+    main_content = ""
+    if info_sec is not None:
+        facts = _parse_facts_table(info_sec.get("table", ""))
+        # subtitle обычно содержит основной текст о команде
+        main_content = info_sec.get("subtitle", "")
+
+    # Таблица игр
+    games_table_html = games_sec.get("content", "") if games_sec is not None else ""
+
     # Формируем стандартные 4 блока для команд КВН
     text_blocks = []
     
@@ -319,56 +403,40 @@ def build_team_doc(sc, tv_by_id: dict[str, str], tv_map: dict[str, str], image_m
             'title': '',
             'content': main_content,
         })
-    
+
     # 1. Состав команды КВН
-    sostav = None
-    for block in all_text_sections:
-        if 'Состав' in block['title']:
-            sostav = block
-            break
     if sostav:
         text_blocks.append(sostav)
     
     # 2. История команды - объединяем все блоки с "История"
-    history_blocks = [b for b in all_text_sections if 'История' in b['title']]
-    if history_blocks:
-        combined_history = '\n\n'.join([b['content'] for b in history_blocks])
+    if history_parts:
         text_blocks.append({
             'title': 'История команды',
-            'content': combined_history,
+            'content': '\n\n'.join(history_parts),
         })
     
     # 3. Сторонние проекты
-    projects = None
-    for block in all_text_sections:
-        if 'Сторонние проекты' in block['title']:
-            projects = block
-            break
-    if projects:
+    if projects_content:
         text_blocks.append({
             'title': 'Сторонние проекты команды после/во время игры в КВН',
-            'content': projects['content'],
+            'content': projects_content,
         })
     
     # 4. Список игр команды (легенда + таблица)
-    games = None
-    for block in all_text_sections:
-        if 'Список игр' in block['title']:
-            games = block
-            break
-    if games:
+    if games_content:
         # Добавляем легенду и таблицу
-        games_content = games['content']
+        games_parts = [games_content]
         if games_table_html:
-            games_content = games_content + "\n\n" + games_table_html
+            games_parts.append(games_table_html)
         
         text_blocks.append({
             'title': 'Список игр команды',
-            'content': games_content,
+            'content': '\n\n'.join(games_parts),
         })
 
-    # Таймлайн
-    timeline_events = _timeline_from_migx_sections(sections)
+    # Таймлайн (функция сама берёт первую секцию с list_triple — отдаём ей только
+    # секции "timeline", чтобы не проходить весь список ещё раз)
+    timeline_events = _timeline_from_migx_sections(timeline_secs)
 
     # Tags - из TV переменной
     tags = _tags_from_tv(tv_named.get('tags', ''), tag_map)
@@ -407,11 +475,62 @@ def build_team_doc(sc, tv_by_id: dict[str, str], tv_map: dict[str, str], image_m
         tags=tags,
         rating=rating,
         social_links=social_links,
+        now_iso=now_iso,
     )
 
     return doc
 
 
+# Меньше команд на процесс — старт пула дороже самой сборки
+MIN_TEAMS_PER_WORKER = 10
+
+
+def _build_one(item, tv_map, image_map, tag_map, now_iso: str):
+    """(team_id, sc, tv_by_id) -> (team_id, doc | None); ошибка одной команды не роняет пачку."""
+    team_id, sc, tv_by_id = item
+    try:
+        return team_id, build_team_doc(sc, tv_by_id, tv_map, image_map, tag_map, now_iso)
+    except Exception as e:
+        print(f"❌ Ошибка импорта ID {team_id}: {e}")
+        traceback.print_exc()
+        return team_id, None
+
+
+def _build_docs(work: list, tv_map, image_map, tag_map, workers: int | None) -> list[tuple[int, dict]]:
+    """[(team_id, sc, tv_by_id)] -> [(team_id, doc)] в том же порядке, без упавших."""
+    # Одна метка времени на весь прогон — и в основном процессе, и в воркерах
+    now_iso = datetime.now(timezone.utc).isoformat()
+    results = build_in_pool(
+        _build_one, work, (tv_map, image_map, tag_map, now_iso), workers, MIN_TEAMS_PER_WORKER
+    )
+    return [(team_id, doc) for team_id, doc in results if doc is not None]
+
+
+def _print_team_summary(team_id: int, doc: dict) -> None:
+    """Подробная сводка по собранному документу (MIGRATE_VERBOSE=1)."""
+    # Модули раскладываем по типу за один проход
+    by_type = {}
+    for m in doc['modules']:
+        by_type.setdefault(m['type'], []).append(m)
+    text_modules = by_type.get('text_block', [])
+    timelines = by_type.get('timeline', [])
+
+    print(f"\n{'='*60}")
+    print(f"ID {team_id}: {doc['title']} ({doc['slug']})")
+    print(f"{'='*60}")
+    print(f"Facts: {len(doc['facts'])} items")
+    for k, v in doc['facts'].items():
+        print(f"  - {k}: {v[:60]}")
+    print(f"Text blocks: {len(text_modules)}")
+    for m in text_modules:
+        print(f"  - {m['title'] or '(Без заголовка)'}: {len(m['data']['content'])} chars")
+    if timelines:
+        print(f"Timeline: {len(timelines[0]['data']['items'])} events")
+    print(f"Tags: {doc['tags']}")
+    print(f"Rating: {doc['rating']['average']} ({doc['rating']['count']} votes)")
+    print(f"Logo: {doc['logo']}")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Импорт команд КВН из SQL в MongoDB")
     parser.add_argument("--ids", nargs="+", type=int, help="Конкретные ID команд для импорта")
@@ -419,6 +538,12 @@ def main():
     parser.add_argument("--limit", type=int, default=1, help="Количество команд для импорта из списка")
     parser.add_argument("--dry-run", action="store_true", help="Только показать, не сохранять")
     parser.add_argument("--apply", action="store_true", help="Применить изменения")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help=f"Процессов для сборки документов (по умолчанию: все ядра, если в пачке от {PARALLEL_MIN_BATCH} команд)",
+    )
     args = parser.parse_args()
 
     if not args.dry_run and not args.apply:
@@ -433,12 +558,14 @@ def main():
             print(f"Файл {KVN_TEAMS_LIST_FILE} не найден. Запустите сначала build_kvn_teams_list.py")
             return
         
-        with open(KVN_TEAMS_LIST_FILE, "r", encoding="utf-8") as f:
-            teams_list = json.load(f)
+        with open(KVN_TEAMS_LIST_FILE, "rb") as f:
+            teams_list = json_loads(f.read())
         
-        # Берём первые pending
-        pending = [t for t in teams_list if t.get("status") == "pending"]
-        target_ids = set([t["id"] for t in pending[:args.limit]])
+        # Берём первые pending (дальше --limit список не просматриваем); записи
+        # держим по id, чтобы потом поменять им статус без прохода по всему списку
+        pending = (t for t in teams_list if t.get("status") == "pending")
+        pending_by_id = {t["id"]: t for t in islice(pending, args.limit)}
+        target_ids = set(pending_by_id)
         
         if not target_ids:
             print("Нет pending команд для импорта")
@@ -455,78 +582,79 @@ def main():
     tag_map = _load_tag_map()
     site_content, tv_values = _extract_for_ids(target_ids)
 
-    # Подключение к MongoDB
-    client = None
+    # Подключение к MongoDB — общий клиент из utils (w=1, пул побольше: это пакетный
+    # импорт, а не онлайн-запись; закрывается при выходе из процесса)
     collection = None
     if args.apply:
-        client = pymongo.MongoClient(MONGO_URL)
-        db = client[DB_NAME]
+        db = get_db()
         collection = db["teams"]  # Store teams in 'teams' collection
+        # slug уникален во всей коллекции (тот же индекс, что создаёт backend) —
+        # проверка существующих по $in идёт по нему, content_type в индексе не нужен
+        collection.create_index([('slug', pymongo.ASCENDING)], unique=True)
+        ensure_tag_name_index(db)
 
-    imported_count = 0
-    
+    work = []
     for team_id in sorted(target_ids):
         sc = site_content.get(team_id)
         if not sc:
             print(f"⚠️  ID {team_id}: не найден в SQL")
             continue
 
-        tv_by_id = tv_values.get(team_id, {})
-        
-        try:
-            doc = build_team_doc(sc, tv_by_id, tv_map, image_map, tag_map)
-            
-            # print(f"\n{'='*60}")
-            # print(f"ID {team_id}: {doc['title']} ({doc['slug']})")
-            # print(f"{'='*60}")
-            # print(f"Facts: {len(doc['facts'])} items")
-            # for k, v in doc['facts'].items():
-            #     print(f"  - {k}: {v[:60]}")
-            # print(f"Text blocks: {len([m for m in doc['modules'] if m['type'] == 'text_block'])}")
-            # for m in doc['modules']:
-            #     if m['type'] == 'text_block':
-            #         print(f"  - {m['title'] or '(Без заголовка)'}: {len(m['data']['content'])} chars")
-            
-            # timeline_count = len([m for m in doc['modules'] if m['type'] == 'timeline'])
-            # if timeline_count:
-            #     timeline = [m for m in doc['modules'] if m['type'] == 'timeline'][0]
-                # print(f"Timeline: {len(timeline['data']['items'])} events")
-            
-            # print(f"Tags: {doc['tags']}")
-            # print(f"Rating: {doc['rating']['average']} ({doc['rating']['count']} votes)")
-            # print(f"Logo: {doc['logo']}")
-
-            if args.apply:
-                # Проверяем, не существует ли уже
-                existing = collection.find_one({"slug": doc['slug'], "content_type": "team"})
-                if existing:
-                    print(f"⚠️  Команда с slug '{doc['slug']}' уже существует, пропускаем")
-                    continue
-                
-                # Синхронизируем теги в коллекцию tags
-                if doc['tags']:
-                    #print(f"  📌 Syncing {len(doc['tags'])} tags...")
-                    sync_tags_to_collection(doc['tags'], db)
-                
-                collection.insert_one(doc)
-                imported_count += 1
-                #print(f"✅ Импортирован")
-                
-                # Обновляем статус в списке
-                if args.from_list:
-                    for t in teams_list:
-                        if t["id"] == team_id:
-                            t["status"] = "imported"
-                    with open(KVN_TEAMS_LIST_FILE, "w", encoding="utf-8") as f:
-                        json.dump(teams_list, f, ensure_ascii=False, indent=2)
-
-        except Exception as e:
-            print(f"❌ Ошибка импорта ID {team_id}: {e}")
-            import traceback
-            traceback.print_exc()
-
-    if client:
-        client.close()
+        work.append((team_id, sc, tv_values.get(team_id, {})))
+
+    docs = _build_docs(work, tv_map, image_map, tag_map, args.workers)
+    if VERBOSE:
+        for team_id, doc in docs:
+            _print_team_summary(team_id, doc)
+
+    imported_count = 0
+
+    if args.apply and docs:
+        # Какие slug уже есть — одним запросом на всю пачку. Только по slug: индекс по нему
+        # уникален на всю коллекцию (занятый slug не вставится при любом content_type),
+        # а с проекцией без _id запрос целиком покрывается этим индексом
+        existing = {
+            d['slug']
+            for d in collection.find(
+                {"slug": {"$in": [doc['slug'] for _, doc in docs]}},
+                {"slug": 1, "_id": 0},
+            )
+        }
+
+        new_docs = []
+        for team_id, doc in docs:
+            if doc['slug'] in existing:
+                print(f"⚠️  Команда с slug '{doc['slug']}' уже существует, пропускаем")
+                continue
+            existing.add(doc['slug'])
+            new_docs.append((team_id, doc))
+
+        # Все новые команды — одним insert_many (ordered=False: ошибка одной не мешает остальным)
+        inserted = [team_id for team_id, _ in new_docs]
+        if new_docs:
+            try:
+                collection.insert_many([doc for _, doc in new_docs], ordered=False)
+            except pymongo.errors.BulkWriteError as e:
+                failed = set()
+                for err in e.details.get('writeErrors', []):
+                    team_id, doc = new_docs[err['index']]
+                    failed.add(team_id)
+                    print(f"❌ Ошибка импорта ID {team_id}: {err.get('errmsg', err)}")
+                inserted = [team_id for team_id in inserted if team_id not in failed]
+        imported_count = len(inserted)
+
+        # Синхронизируем теги в коллекцию tags (только для реально вставленных команд)
+        inserted_set = set(inserted)
+        sync_tags_to_collection(
+            [tag for team_id, doc in new_docs if team_id in inserted_set for tag in doc['tags']],
+            db,
+        )
+
+        # Обновляем статус в списке — один раз на пачку
+        if args.from_list and inserted_set:
+            for team_id in inserted_set:
+                pending_by_id[team_id]["status"] = "imported"
+            _save_teams_list(teams_list)
 
     print(f"\n{'='*60}")
     print(f"Импортировано: {imported_count} из {len(target_ids)}")
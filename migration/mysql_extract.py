@@ -2,6 +2,8 @@
 """
 Прямой парсинг MySQL INSERT statements для извлечения человека
 """
+import os
+
 import pymysql
 pymysql.install_as_MySQLdb()
 import MySQLdb
@@ -13,69 +15,94 @@ from sqlparse.tokens import Keyword, DML
 import subprocess
 import json
 
+# Параметры подключения берём оттуда же, откуда их берёт клиент mysql
+MYSQL_DEFAULTS_FILE = os.path.expanduser("~/.my.cnf")
+TEMP_DB = "temp_modx"
+PERSON_ID = 350
+
+
+def _connect(db=None):
+    return MySQLdb.connect(
+        db=db,
+        charset="utf8mb4",
+        read_default_file=MYSQL_DEFAULTS_FILE,
+    )
+
+
+def _print_result(cur):
+    """Печатает результат запроса так же, как mysql -e: заголовок и строки через TAB."""
+    print("\t".join(col[0] for col in cur.description))
+    # Курсор серверный (SSCursor): строки идут потоком, без буфера на весь результат
+    for row in cur:
+        print("\t".join("NULL" if v is None else str(v) for v in row))
+
+
 def extract_using_mysql():
     """Use MySQL directly to parse the dump"""
     
     # Create temporary MySQL database
     print("Создаём временную MySQL базу...")
     
-    commands = [
-        "mysql -e 'DROP DATABASE IF EXISTS temp_modx'",
-        "mysql -e 'CREATE DATABASE temp_modx CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci'",
-        "mysql temp_modx < /app/modx_dump.sql 2>&1 | head -20"
-    ]
+    # Ошибка MySQL печатается, как раньше у mysql -e, и скрипт идёт дальше
+    try:
+        conn = _connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"DROP DATABASE IF EXISTS {TEMP_DB}")
+                cur.execute(f"CREATE DATABASE {TEMP_DB} CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
+        finally:
+            conn.close()
+    except MySQLdb.Error as e:
+        print(f"Ошибка: {e}")
     
-    for cmd in commands:
-        print(f"Выполняем: {cmd}")
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        if result.returncode != 0 and "CREATE DATABASE" not in cmd:
-            print(f"Ошибка: {result.stderr[:200]}")
+    # Сам дамп грузим клиентом mysql — это единственный внешний процесс
+    cmd = f"mysql {TEMP_DB} < /app/modx_dump.sql 2>&1 | head -20"
+    print(f"Выполняем: {cmd}")
+    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"Ошибка: {result.stderr[:200]}")
     
     print("\n✅ База создана")
     
-    # Query person
-    print("\nЗапрашиваем человека ID=350...")
-    
-    query = """
-    SELECT 
-        id, pagetitle, alias, introtext, content, 
-        published, template, uri, createdon, editedon
-    FROM modx_site_content 
-    WHERE id=350
-    """
-    
-    result = subprocess.run(
-        f"mysql -e '{query}' temp_modx",
-        shell=True,
-        capture_output=True,
-        text=True
-    )
-    
-    if result.returncode == 0:
-        print("Результат:")
-        print(result.stdout)
-    else:
-        print(f"Ошибка: {result.stderr}")
-    
-    # Query TV values
-    print("\nЗапрашиваем TV values...")
-    
-    query_tv = """
-    SELECT tmplvarid, value
-    FROM modx_site_tmplvar_contentvalues
-    WHERE contentid=350
-    """
-    
-    result_tv = subprocess.run(
-        f"mysql -e '{query_tv}' temp_modx",
-        shell=True,
-        capture_output=True,
-        text=True
-    )
-    
-    if result_tv.returncode == 0:
-        print("TV Values:")
-        print(result_tv.stdout)
+    # Оба запроса идут через одно соединение, без отдельного mysql-процесса на каждый
+    try:
+        conn = _connect(TEMP_DB)
+    except MySQLdb.Error as e:
+        print(f"Ошибка: {e}")
+        return
+    try:
+        with conn.cursor(pymysql.cursors.SSCursor) as cur:
+            # Query person
+            print(f"\nЗапрашиваем человека ID={PERSON_ID}...")
+            
+            query = """
+            SELECT 
+                id, pagetitle, alias, introtext, content, 
+                published, template, uri, createdon, editedon
+            FROM modx_site_content 
+            WHERE id=%s
+            """
+            
+            cur.execute(query, (PERSON_ID,))
+            print("Результат:")
+            _print_result(cur)
+            
+            # Query TV values
+            print("\nЗапрашиваем TV values...")
+            
+            query_tv = """
+            SELECT tmplvarid, value
+            FROM modx_site_tmplvar_contentvalues
+            WHERE contentid=%s
+            """
+            
+            cur.execute(query_tv, (PERSON_ID,))
+            print("TV Values:")
+            _print_result(cur)
+    except MySQLdb.Error as e:
+        print(f"Ошибка: {e}")
+    finally:
+        conn.close()
 
 if __name__ == "__main__":
     extract_using_mysql()
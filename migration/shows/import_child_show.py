@@ -19,26 +19,51 @@ import json
 import os
 import re
 import sys
+import traceback
+from collections import Counter
 from datetime import datetime, timezone
-from uuid import uuid4
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import pymongo
 from import_people_from_sql import (
+    PARALLEL_MIN_BATCH,
+    TAG_NAME_COLLATION,
+    TRANSLIT_MAP,
     _extract_for_ids,
+    _iter_insert_blobs,
     _load_image_map,
+    _mmap_sql,
     _load_tv_map,
     _parse_migx,
     _split_rows,
     _split_fields,
     _unescape_sql_string,
+    _values_body,
+    build_in_pool,
+    ensure_tag_name_index,
 )
-from utils import DB_NAME, MONGO_URL, normalize_rich_text
+from utils import get_db, normalize_rich_text, uuid_batch
 
 SQL_FILE = "/app/humorbd.sql"
 TAG_MAP_FILE = "/app/migration/tag_mapping.json"
 
+_FACTS_ROW_RE = re.compile(
+    r'<tr[^>]*>\s*<td[^>]*>(.*?)</td>\s*<td[^>]*>(.*?)</td>\s*</tr>',
+    re.IGNORECASE | re.DOTALL,
+)
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+_NON_SLUG_RE = re.compile(r'[^a-z0-9-]')
+# Подстрока ссылки -> ключ social_links (первое совпадение по порядку, иначе website)
+_SOCIAL_MAP = (
+    ('vk.com', 'vk'),
+    ('youtube', 'youtube'),
+    ('telegram', 'telegram'),
+    ('t.me', 'telegram'),
+)
+# Кириллица -> латиница и пробел -> "-" одним str.translate
+_TAG_SLUG_TABLE = str.maketrans({**TRANSLIT_MAP, ' ': '-'})
+
 
 def _load_tag_map():
     if not os.path.exists(TAG_MAP_FILE):
@@ -47,161 +72,147 @@ def _load_tag_map():
         return json.load(f)
 
 
-def get_sql_parent_id_for_show(slug: str, db) -> int:
-    """Получает SQL ID родителя по slug из MongoDB."""
-    # Находим шоу по slug
-    show = db.shows.find_one({"slug": slug}, {"_id": 1, "title": 1})
-    if not show:
-        return None
-    
-    # Теперь найдём SQL ID по title в SQL дампе
-    with open(SQL_FILE, 'r', encoding='utf-8', errors='replace') as f:
-        for line in f:
-            if 'INSERT INTO `modx_site_content`' in line:
-                break
-        
-        content = f.read()
-    
-    # Ищем полный INSERT
-    in_sc = False
-    buf = []
-    
-    with open(SQL_FILE, 'r', encoding='utf-8', errors='replace') as f:
-        for line in f:
-            if not in_sc:
-                if line.startswith('INSERT INTO `modx_site_content`'):
-                    in_sc = True
-                    buf = [line]
-                continue
-            
-            buf.append(line)
-            if not line.strip().endswith(';'):
-                continue
-            
-            blob = ''.join(buf)
-            in_sc = False
-            buf = []
-            
-            m = re.search(r'VALUES\s*(.*);\s*$', blob, flags=re.DOTALL)
-            if not m:
-                continue
-            
-            rows = _split_rows(m.group(1))
-            for r in rows:
-                parts = _split_fields(r)
-                if not parts or parts[0] is None:
-                    continue
-                
-                if len(parts) <= 6:
-                    continue
-                
-                try:
-                    rid = int(str(parts[0]).strip())
-                    alias = _unescape_sql_string(parts[6]) if parts[6] else ''
-                    
-                    if alias == slug:
-                        return rid
-                except:
-                    continue
-    
-    return None
+# (SQL ID, parent | None, alias, pagetitle) по всем рядам modx_site_content в порядке дампа.
+# Дамп разбирается один раз за процесс; и поиск родителя, и список детей берут его отсюда.
+# pagetitle хранится как в дампе (экранированным) — раскрывается только у найденных детей.
+_SC_ROWS: list[tuple[int, int | None, str, str]] | None = None
 
 
-def get_children_from_sql(parent_sql_id: int) -> list[dict]:
-    """Получает список дочерних страниц из SQL."""
-    children = []
-    
-    in_sc = False
-    buf = []
-    
-    with open(SQL_FILE, 'r', encoding='utf-8', errors='replace') as f:
-        for line in f:
-            if not in_sc:
-                if line.startswith('INSERT INTO `modx_site_content`'):
-                    in_sc = True
-                    buf = [line]
-                continue
-            
-            buf.append(line)
-            if not line.strip().endswith(';'):
-                continue
-            
-            blob = ''.join(buf)
-            in_sc = False
-            buf = []
-            
-            m = re.search(r'VALUES\s*(.*);\s*$', blob, flags=re.DOTALL)
-            if not m:
+def _iter_sc_rows():
+    """(rid, parent, alias, raw_pagetitle) по всем рядам INSERT INTO `modx_site_content`.
+
+    parent = None, если колонки parent нет или она не разбирается.
+    """
+    # mmap + поиск INSERT по байтам: декодируются только INSERT-ы modx_site_content,
+    # а не весь дамп построчно со склейкой строк
+    with _mmap_sql(SQL_FILE) as mm:
+        for _, blob in _iter_insert_blobs(mm, ("modx_site_content",)):
+            values_str = _values_body(blob)
+            if values_str is None:
                 continue
             
-            rows = _split_rows(m.group(1))
+            rows = _split_rows(values_str)
             for r in rows:
                 parts = _split_fields(r)
-                if not parts or parts[0] is None:
+                # Нужны только id, pagetitle, alias и parent — достаём их из списка один раз
+                n = len(parts)
+                if n <= 6:
                     continue
-                
-                if len(parts) <= 12:
+                rid_s = parts[0]
+                if rid_s is None:
                     continue
                 
                 try:
-                    rid = int(str(parts[0]).strip())
-                    parent = int(str(parts[12]).strip()) if parts[12] else 0
-                    
-                    if parent == parent_sql_id:
-                        title = _unescape_sql_string(parts[3]) if parts[3] else ''
-                        alias = _unescape_sql_string(parts[6]) if parts[6] else ''
-                        children.append({
-                            'sql_id': rid,
-                            'title': title,
-                            'slug': alias
-                        })
+                    rid = int(rid_s)
                 except:
                     continue
+                
+                parent = None
+                if n > 12:
+                    parent_s = parts[12]
+                    try:
+                        parent = int(parent_s) if parent_s else 0
+                    except:
+                        pass
+                
+                # unescape трогает только "\\" и "\'": без обратного слэша строка уже готова
+                alias = parts[6] or ''
+                if '\\' in alias:
+                    alias = _unescape_sql_string(alias)
+                title = parts[3]
+                yield rid, parent, alias, title or ''
+
+
+def _sc_rows() -> list[tuple[int, int | None, str, str]]:
+    global _SC_ROWS
+    if _SC_ROWS is None:
+        _SC_ROWS = list(_iter_sc_rows())
+    return _SC_ROWS
+
+
+def get_sql_parent_id_for_show(slug: str, db) -> int:
+    """Получает SQL ID родителя по slug из MongoDB."""
+    # Находим шоу по slug
+    show = db.shows.find_one({"slug": slug}, {"_id": 1, "title": 1})
+    if not show:
+        return None
     
-    return children
+    # Теперь найдём SQL ID по alias в SQL дампе (первый в порядке файла)
+    return next((rid for rid, _, alias, _ in _sc_rows() if alias == slug), None)
 
 
-def sync_tags_to_collection(tags: list[str], db) -> None:
-    """Синхронизация тегов с коллекцией tags."""
-    if not tags:
+def get_children_from_sql(parent_sql_id: int) -> list[dict]:
+    """Получает список дочерних страниц из SQL."""
+    return [
+        {
+            'sql_id': rid,
+            'title': _unescape_sql_string(raw_title),
+            'slug': alias
+        }
+        for rid, parent, alias, raw_title in _sc_rows()
+        if parent == parent_sql_id
+    ]
+
+
+def ensure_full_path_index(db) -> None:
+    """Уникальный индекс shows.full_path — по нему идёт проверка существующих страниц."""
+    try:
+        db.shows.create_index([("full_path", pymongo.ASCENDING)], name="full_path_1", unique=True)
+    except pymongo.errors.OperationFailure as e:
+        # в базе уже есть дубли full_path — уникальность не навесить, но индекс всё равно нужен
+        print(f"⚠️  Не удалось создать уникальный индекс shows.full_path: {e}")
+        db.shows.create_index([("full_path", pymongo.ASCENDING)], name="full_path_1")
+
+
+def _tag_slug(tag_name: str) -> str:
+    """Slug нового тега: транслитерация, пробелы -> "-", прочее кроме [a-z0-9-] выкидываем."""
+    return _NON_SLUG_RE.sub('', tag_name.lower().translate(_TAG_SLUG_TABLE))
+
+
+def sync_tags_to_collection(tags: list[str], db, now_iso: str = None) -> None:
+    """Синхронизация тегов с коллекцией tags.
+
+    Все теги пачки уходят одним bulk_write: upsert по имени без учёта регистра
+    (коллация, как в import_kvn_team), usage_count растёт на число вхождений тега.
+    Отдельного name_lower нет: теги создаёт и backend (TagService), только с name,
+    а индекс name_ci с коллацией находит их по тому же равенству.
+    """
+    # Варианты одного тега, отличающиеся только регистром, под коллацией — один документ:
+    # складываем их по casefold заранее (имя — первое написание), чтобы не слать
+    # на сервер несколько upsert-ов в одну и ту же запись
+    counts = Counter()
+    names = {}
+    for t in tags or []:
+        t = t.strip()
+        if t:
+            counts[names.setdefault(t.casefold(), t)] += 1
+    if not counts:
         return
     
-    for tag_name in tags:
-        tag_name = tag_name.strip()
-        if not tag_name:
-            continue
-        
-        existing = db.tags.find_one({
-            "name": {"$regex": f"^{re.escape(tag_name)}$", "$options": "i"}
-        })
-        
-        if not existing:
-            # Транслитерация для slug
-            translit_map = {
-                'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
-                'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
-                'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
-                'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch',
-                'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya'
-            }
-            slug = tag_name.lower().replace(" ", "-")
-            slug = ''.join(translit_map.get(c, c) for c in slug)
-            slug = re.sub(r'[^a-z0-9-]', '', slug)
-            
-            tag_doc = {
-                "_id": str(uuid4()),
-                "name": tag_name,
-                "slug": slug,
-                "old_id": None,
-                "usage_count": 1,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }
-            try:
-                db.tags.insert_one(tag_doc)
-            except:
-                pass
-        else:
-            db.tags.update_one({"_id": existing["_id"]}, {"$inc": {"usage_count": 1}})
+    now = now_iso or datetime.now(timezone.utc).isoformat()
+    ids = uuid_batch(len(counts))
+    ops = [
+        pymongo.UpdateOne(
+            {"name": tag_name},
+            {
+                "$inc": {"usage_count": n},
+                "$setOnInsert": {
+                    "_id": tag_id,
+                    "slug": _tag_slug(tag_name),
+                    "old_id": None,
+                    "created_at": now,
+                },
+            },
+            upsert=True,
+            collation=TAG_NAME_COLLATION,
+        )
+        for (tag_name, n), tag_id in zip(counts.items(), ids)
+    ]
+    try:
+        db.tags.bulk_write(ops, ordered=False)
+    except pymongo.errors.BulkWriteError as e:
+        for err in e.details.get('writeErrors', []):
+            print(f"  ⚠️  Failed to sync tag: {err.get('errmsg', err)}")
 
 
 def _tags_from_tv(tv_tags_str: str, tag_map: dict) -> list[str]:
@@ -215,17 +226,57 @@ def _parse_facts_table(table_html: str) -> dict:
     if not table_html:
         return {}
     facts = {}
-    rows = re.findall(r'<tr[^>]*>\s*<td[^>]*>(.*?)</td>\s*<td[^>]*>(.*?)</td>\s*</tr>', table_html, re.IGNORECASE | re.DOTALL)
-    for key_html, val_html in rows:
-        key = re.sub(r'<[^>]+>', '', key_html).strip()
+    for key_html, val_html in _FACTS_ROW_RE.findall(table_html):
+        key = _HTML_TAG_RE.sub('', key_html).strip()
         val = normalize_rich_text(val_html)
         if key and val:
             facts[key] = val
     return facts
 
 
-def build_child_doc(sc, tv_by_id, tv_map, tag_map, parent_mongo_id: str, parent_full_path: str, level: int):
-    """Строит документ дочернего шоу."""
+def _social_links_from_info(sec: dict) -> dict:
+    """Ссылки из list_social секции info (vk / youtube / telegram / website)."""
+    social_links = {}
+    list_social = sec.get("list_social", "")
+    if list_social:
+        try:
+            if isinstance(list_social, str):
+                social_data = json.loads(list_social)
+            else:
+                social_data = list_social
+            
+            if isinstance(social_data, list):
+                for item in social_data:
+                    if isinstance(item, dict):
+                        link = item.get('link', '')
+                        if link:
+                            for needle, key in _SOCIAL_MAP:
+                                if needle in link:
+                                    social_links[key] = link
+                                    break
+                            else:
+                                social_links['website'] = link
+        except:
+            pass
+    return social_links
+
+
+def build_child_doc(
+    sc,
+    tv_by_id,
+    tv_map,
+    tag_map,
+    parent_mongo_id: str,
+    parent_full_path: str,
+    level: int,
+    now_iso: str = None,
+):
+    """Строит документ дочернего шоу.
+
+    now_iso — общая метка времени для created_at/updated_at (по умолчанию — сейчас).
+    """
+    if now_iso is None:
+        now_iso = datetime.now(timezone.utc).isoformat()
     tv_named = {}
     for tv_id, val in tv_by_id.items():
         tv_name = tv_map.get(tv_id)
@@ -234,41 +285,13 @@ def build_child_doc(sc, tv_by_id, tv_map, tag_map, parent_mongo_id: str, parent_
 
     sections = _parse_migx(tv_named.get("config", ""))
 
-    # Извлекаем факты и ссылки из info секции
+    # Один проход по секциям: факты и ссылки — из первой секции info, модули — из всех
+    # text/table по порядку. Секция даёт не больше одного модуля, так что id на все модули
+    # и сам документ берём одним чтением urandom
     facts = {}
     social_links = {}
-    
-    for sec in sections:
-        if sec.get("MIGX_formname") == "info":
-            table_html = sec.get("table", "")
-            facts = _parse_facts_table(table_html)
-            
-            list_social = sec.get("list_social", "")
-            if list_social:
-                try:
-                    if isinstance(list_social, str):
-                        social_data = json.loads(list_social)
-                    else:
-                        social_data = list_social
-                    
-                    if isinstance(social_data, list):
-                        for item in social_data:
-                            if isinstance(item, dict):
-                                link = item.get('link', '')
-                                if link:
-                                    if 'vk.com' in link:
-                                        social_links['vk'] = link
-                                    elif 'youtube' in link:
-                                        social_links['youtube'] = link
-                                    elif 'telegram' in link or 't.me' in link:
-                                        social_links['telegram'] = link
-                                    else:
-                                        social_links['website'] = link
-                except:
-                    pass
-            break
-
-    # Модули контента
+    info_seen = False
+    ids = iter(uuid_batch(1 + len(sections)))
     modules = []
     order = 1
     
@@ -281,7 +304,7 @@ def build_child_doc(sc, tv_by_id, tv_map, tag_map, parent_mongo_id: str, parent_
             
             if content:
                 modules.append({
-                    'id': str(uuid4()),
+                    'id': next(ids),
                     'type': 'text_block',
                     'order': order,
                     'title': title,
@@ -299,7 +322,7 @@ def build_child_doc(sc, tv_by_id, tv_map, tag_map, parent_mongo_id: str, parent_
             
             if table_html:
                 modules.append({
-                    'id': str(uuid4()),
+                    'id': next(ids),
                     'type': 'text_block',
                     'order': order,
                     'title': title,
@@ -310,6 +333,11 @@ def build_child_doc(sc, tv_by_id, tv_map, tag_map, parent_mongo_id: str, parent_
                     }
                 })
                 order += 1
+        
+        elif formname == 'info' and not info_seen:
+            info_seen = True
+            facts = _parse_facts_table(sec.get("table", ""))
+            social_links = _social_links_from_info(sec)
 
     # Tags
     tags = _tags_from_tv(tv_named.get('tags', ''), tag_map)
@@ -335,7 +363,7 @@ def build_child_doc(sc, tv_by_id, tv_map, tag_map, parent_mongo_id: str, parent_
     full_path = f"{parent_full_path}/{sc.alias}"
 
     doc = {
-        '_id': str(uuid4()),
+        '_id': next(ids),
         'content_type': 'show',
         'title': sc.pagetitle,
         'slug': sc.alias,
@@ -344,8 +372,8 @@ def build_child_doc(sc, tv_by_id, tv_map, tag_map, parent_mongo_id: str, parent_
         'name': sc.longtitle or sc.pagetitle,
         'status': 'published',
         'tags': tags,
-        'created_at': datetime.now(timezone.utc).isoformat(),
-        'updated_at': datetime.now(timezone.utc).isoformat(),
+        'created_at': now_iso,
+        'updated_at': now_iso,
         'facts': facts,
         'social_links': social_links,
         'description': normalize_rich_text(sc.description) if sc.description else '',
@@ -371,6 +399,40 @@ def build_child_doc(sc, tv_by_id, tv_map, tag_map, parent_mongo_id: str, parent_
     return doc
 
 
+# Сборка документов — чистый CPU (regex, normalize, dict) на уже извлечённых данных:
+# потоки упёрлись бы в GIL, поэтому большие пачки собираются в процессах, как у KVN
+MIN_CHILDREN_PER_WORKER = 10
+
+
+def _build_one(item, tv_map, tag_map, parent_mongo_id, parent_full_path, level, now_iso: str):
+    """(sql_id, sc, tv_by_id) -> (sql_id, doc | None); ошибка одной страницы не роняет пачку."""
+    sql_id, sc, tv_by_id = item
+    try:
+        return sql_id, build_child_doc(
+            sc, tv_by_id, tv_map, tag_map, parent_mongo_id, parent_full_path, level, now_iso
+        )
+    except Exception as e:
+        print(f"❌ Ошибка импорта SQL ID {sql_id}: {e}")
+        traceback.print_exc()
+        return sql_id, None
+
+
+def _build_docs(
+    work: list,
+    tv_map,
+    tag_map,
+    parent_mongo_id,
+    parent_full_path,
+    level,
+    now_iso: str,
+    workers: int | None,
+) -> list[tuple[int, dict]]:
+    """[(sql_id, sc, tv_by_id)] -> [(sql_id, doc)] в том же порядке, без упавших."""
+    initargs = (tv_map, tag_map, parent_mongo_id, parent_full_path, level, now_iso)
+    results = build_in_pool(_build_one, work, initargs, workers, MIN_CHILDREN_PER_WORKER)
+    return [(sql_id, doc) for sql_id, doc in results if doc is not None]
+
+
 def main():
     parser = argparse.ArgumentParser(description="Импорт дочерних страниц шоу")
     parser.add_argument("--parent-slug", required=True, help="Slug родительского шоу (напр. comedy-battle)")
@@ -378,6 +440,12 @@ def main():
     parser.add_argument("--all", action="store_true", help="Импортировать все дочерние страницы")
     parser.add_argument("--dry-run", action="store_true", help="Только показать")
     parser.add_argument("--apply", action="store_true", help="Применить изменения")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help=f"Процессов для сборки документов (по умолчанию: все ядра, если в пачке от {PARALLEL_MIN_BATCH} страниц)",
+    )
     args = parser.parse_args()
 
     if not args.dry_run and not args.apply:
@@ -389,14 +457,16 @@ def main():
         return
 
     # Подключение к MongoDB
-    client = pymongo.MongoClient(MONGO_URL)
-    db = client[DB_NAME]
+    db = get_db()
+    if args.apply:
+        # Индексы под пакетную проверку full_path и upsert тегов с коллацией
+        ensure_full_path_index(db)
+        ensure_tag_name_index(db)
 
     # Находим родителя
     parent = db.shows.find_one({"slug": args.parent_slug})
     if not parent:
         print(f"❌ Родительское шоу '{args.parent_slug}' не найдено в MongoDB")
-        client.close()
         return
 
     parent_mongo_id = parent['_id']
@@ -413,7 +483,6 @@ def main():
     parent_sql_id = get_sql_parent_id_for_show(args.parent_slug, db)
     if not parent_sql_id:
         print(f"❌ Не удалось найти SQL ID для '{args.parent_slug}'")
-        client.close()
         return
 
     print(f"SQL ID родителя: {parent_sql_id}")
@@ -427,7 +496,6 @@ def main():
         children = [c for c in children if c['sql_id'] == args.child_id]
         if not children:
             print(f"❌ Дочерняя страница с SQL ID {args.child_id} не найдена")
-            client.close()
             return
 
     # Загружаем данные для импорта
@@ -437,56 +505,75 @@ def main():
     imported_count = 0
     child_mongo_ids = list(parent.get('child_show_ids', []))
 
+    # Данные всех дочерних из SQL — одним проходом по дампу, а не проходом на каждую
+    site_content, tv_values = _extract_for_ids({c['sql_id'] for c in children}) if children else ({}, {})
+    # Одна метка времени на весь прогон: created_at/updated_at страниц (и в воркерах) и новых тегов
+    now_iso = datetime.now(timezone.utc).isoformat()
+
+    work = []
     for child in children:
         sql_id = child['sql_id']
         
-        # Получаем данные из SQL
-        site_content, tv_values = _extract_for_ids({sql_id})
         sc = site_content.get(sql_id)
         
         if not sc:
             print(f"⚠️ SQL ID {sql_id}: не найден")
             continue
 
-        tv_by_id = tv_values.get(sql_id, {})
-
-        try:
-            doc = build_child_doc(sc, tv_by_id, tv_map, tag_map, parent_mongo_id, parent_full_path, child_level)
-
-            print(f"{'='*60}")
-            print(f"SQL ID {sql_id}: {doc['title']}")
-            print(f"{'='*60}")
-            print(f"Slug: {doc['slug']}")
-            print(f"Full path: {doc['full_path']}")
-            print(f"Level: {doc['level']}")
-            print(f"Description: {doc['description'][:100] if doc['description'] else '(нет)'}...")
-            print(f"Facts: {len(doc['facts'])} items")
-            print(f"Modules: {len(doc['modules'])}")
-            print(f"Tags: {len(doc['tags'])}")
-            print(f"Social links: {doc['social_links']}")
-            print()
-
-            if args.apply:
-                # Проверяем, существует ли уже
-                existing = db.shows.find_one({"full_path": doc['full_path']})
-                if existing:
-                    print(f"⚠️ Страница с full_path '{doc['full_path']}' уже существует")
-                    continue
-
-                # Синхронизируем теги
-                if doc['tags']:
-                    sync_tags_to_collection(doc['tags'], db)
-
-                # Вставляем документ
-                db.shows.insert_one(doc)
-                child_mongo_ids.append(doc['_id'])
-                imported_count += 1
-                print(f"✅ Импортировано: {doc['full_path']}")
+        work.append((sql_id, sc, tv_values.get(sql_id, {})))
+
+    docs = _build_docs(
+        work, tv_map, tag_map, parent_mongo_id, parent_full_path, child_level, now_iso, args.workers
+    )
+    for sql_id, doc in docs:
+        print(f"{'='*60}")
+        print(f"SQL ID {sql_id}: {doc['title']}")
+        print(f"{'='*60}")
+        print(f"Slug: {doc['slug']}")
+        print(f"Full path: {doc['full_path']}")
+        print(f"Level: {doc['level']}")
+        print(f"Description: {doc['description'][:100] if doc['description'] else '(нет)'}...")
+        print(f"Facts: {len(doc['facts'])} items")
+        print(f"Modules: {len(doc['modules'])}")
+        print(f"Tags: {len(doc['tags'])}")
+        print(f"Social links: {doc['social_links']}")
+        print()
+
+    if args.apply and docs:
+        # Какие full_path уже есть — одним distinct на всю пачку: сервер отвечает одним
+        # документом со значениями прямо из индекса full_path_1, без курсора и getMore
+        existing = set(db.shows.distinct(
+            "full_path",
+            {"full_path": {"$in": [doc['full_path'] for _, doc in docs]}},
+        ))
+
+        new_docs = []
+        for sql_id, doc in docs:
+            if doc['full_path'] in existing:
+                print(f"⚠️ Страница с full_path '{doc['full_path']}' уже существует")
+                continue
+            existing.add(doc['full_path'])
+            new_docs.append(doc)
 
-        except Exception as e:
-            print(f"❌ Ошибка импорта SQL ID {sql_id}: {e}")
-            import traceback
-            traceback.print_exc()
+        # Все новые страницы — одним insert_many (ordered=False: ошибка одной не мешает остальным)
+        inserted = new_docs
+        if new_docs:
+            try:
+                db.shows.insert_many(new_docs, ordered=False)
+            except pymongo.errors.BulkWriteError as e:
+                failed = set()
+                for err in e.details.get('writeErrors', []):
+                    failed.add(err['index'])
+                    print(f"❌ Ошибка импорта {new_docs[err['index']]['full_path']}: {err.get('errmsg', err)}")
+                inserted = [doc for i, doc in enumerate(new_docs) if i not in failed]
+
+        for doc in inserted:
+            child_mongo_ids.append(doc['_id'])
+            print(f"✅ Импортировано: {doc['full_path']}")
+        imported_count = len(inserted)
+
+        # Синхронизируем теги (только для реально вставленных страниц)
+        sync_tags_to_collection([tag for doc in inserted for tag in doc['tags']], db, now_iso)
 
     # Обновляем child_show_ids у родителя
     if args.apply and imported_count > 0:
@@ -496,7 +583,6 @@ def main():
         )
         print(f"\n✅ Обновлён родитель: {len(child_mongo_ids)} дочерних страниц")
 
-    client.close()
 
     print(f"\n{'='*60}")
     print(f"Импортировано: {imported_count}")
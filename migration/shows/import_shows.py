@@ -21,26 +21,34 @@
 from __future__ import annotations
 
 import argparse
-import json
 import os
 import re
 import sys
+from collections import Counter, defaultdict
 from datetime import datetime, timezone
-from uuid import uuid4
+from functools import lru_cache
+from itertools import islice
 
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import pymongo
 from import_people_from_sql import (
+    PARALLEL_MIN_BATCH,
+    TAG_NAME_COLLATION,
     _extract_for_ids,
+    _iter_insert_blobs,
     _load_image_map,
     _load_tv_map,
+    _mmap_sql,
     _parse_migx,
     _split_rows,
     _split_fields,
+    _values_body,
+    build_in_pool,
+    ensure_tag_name_index,
 )
-from utils import DB_NAME, MONGO_URL, normalize_rich_text
+from utils import get_db, json_dumps, json_loads, normalize_rich_text, uuid_batch
 
 # SQL_FILE = "/app/humorbd.sql"
 # TAG_MAP_FILE = "/app/migration/tag_mapping.json"
@@ -52,41 +60,63 @@ SHOWS_LIST_FILE = "C:\\Users\\rdp6126443.gmail.com\\humorpedia\\migration\\shows
 IMAGE_MAP_FILE = "C:\\Users\\rdp6126443.gmail.com\\humorpedia\\migration\\image_mapping.json"
 TAG_MAP_FILE = "C:\\Users\\rdp6126443.gmail.com\\humorpedia\\migration\\tag_mapping.json"
 
+# Регулярки компилируются один раз на модуль, а не ищутся в re-кеше на каждом шоу
+_NON_SLUG_RE = re.compile(r'[^a-z0-9-]')
+_DASHES_RE = re.compile(r'-+')
+# Строка таблицы фактов — тот же линейный паттерн, что в import_kvn_team: первые две
+# ячейки <td> (атрибуты допустимы, лишние ячейки пропускаются), захват не перешагивает
+# </td>. HTML-парсер не нужен: он бы ещё и переписал разметку значений фактов
+_TD_INNER = r'[^<]*(?:<(?!/td>)[^<]*)*'
+_FACTS_ROW_RE = re.compile(
+    rf'<tr\b[^>]*>\s*<td\b[^>]*>({_TD_INNER})</td>\s*<td\b[^>]*>({_TD_INNER})</td>'
+    rf'(?:\s*<td\b[^>]*>{_TD_INNER}</td>)*\s*</tr>',
+    re.IGNORECASE,
+)
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+# Подстрока ссылки -> ключ social_links (первое совпадение по порядку, иначе website)
+_SOCIAL_MAP = (
+    ('vk.com', 'vk'),
+    ('vkontakte', 'vk'),
+    ('youtube', 'youtube'),
+    ('instagram', 'instagram'),
+    ('instagr.am', 'instagram'),
+    ('telegram', 'telegram'),
+    ('t.me', 'telegram'),
+)
+# Первый абзац/заголовок описания (убирается, если дублирует название шоу)
+_LEADING_BLOCK_RE = re.compile(r'^<[ph]\d?>.*?</[ph]\d?>', re.IGNORECASE | re.DOTALL)
+
 
 def _load_shows_list() -> list[dict]:
     """Загружает список шоу из JSON."""
     if not os.path.exists(SHOWS_LIST_FILE):
         return []
-    with open(SHOWS_LIST_FILE, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    with open(SHOWS_LIST_FILE, 'rb') as f:
+        return json_loads(f.read())
 
 
 def _save_shows_list(shows: list[dict]) -> None:
-    """Сохраняет список шоу в JSON."""
-    with open(SHOWS_LIST_FILE, 'w', encoding='utf-8') as f:
-        json.dump(shows, f, ensure_ascii=False, indent=2)
-
-
-def _mark_show_imported(show_id: int) -> None:
-    """Отмечает шоу как импортированное в shows_list.json."""
-    shows = _load_shows_list()
-    for show in shows:
-        if show['id'] == show_id:
-            show['status'] = 'imported'
-            show['imported_at'] = datetime.now(timezone.utc).isoformat()
-            break
-    _save_shows_list(shows)
+    """Сохраняет список шоу в JSON атомарно: tmp-файл + os.replace."""
+    tmp_path = SHOWS_LIST_FILE + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(json_dumps(shows, indent=True))
+    os.replace(tmp_path, SHOWS_LIST_FILE)
 
 
-def _mark_show_error(show_id: int, error: str) -> None:
-    """Отмечает шоу с ошибкой."""
-    shows = _load_shows_list()
-    for show in shows:
-        if show['id'] == show_id:
-            show['status'] = 'error'
-            show['error'] = error[:200]
-            break
-    _save_shows_list(shows)
+def _mark_show_imported(shows_by_id: dict[int, dict], show_id: int, now_iso: str) -> None:
+    """Отмечает шоу как импортированное (в памяти; файл пишется один раз в конце прогона)."""
+    show = shows_by_id.get(show_id)
+    if show is not None:
+        show['status'] = 'imported'
+        show['imported_at'] = now_iso
+
+
+def _mark_show_error(shows_by_id: dict[int, dict], show_id: int, error: str) -> None:
+    """Отмечает шоу с ошибкой (в памяти; файл пишется один раз в конце прогона)."""
+    show = shows_by_id.get(show_id)
+    if show is not None:
+        show['status'] = 'error'
+        show['error'] = error[:200]
 
 
 # Transliteration map for cyrillic -> latin slugs
@@ -98,48 +128,61 @@ TRANSLIT_MAP = {
     'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya'
 }
 
+# Пробел -> "-", точка/запятая убираются, кириллица -> латиница: одним str.translate
+_SLUG_TABLE = str.maketrans({**TRANSLIT_MAP, ' ': '-', '.': '', ',': ''})
 
+
+# Имена тегов сильно повторяются между шоу — slug считается один раз на имя
+@lru_cache(maxsize=4096)
 def transliterate_slug(text: str) -> str:
     """Convert cyrillic text to latin slug"""
-    slug = text.lower().replace(" ", "-").replace(".", "").replace(",", "")
-    slug = ''.join(TRANSLIT_MAP.get(char, char) for char in slug)
-    slug = re.sub(r'[^a-z0-9-]', '', slug)
-    slug = re.sub(r'-+', '-', slug)
+    slug = text.lower().translate(_SLUG_TABLE)
+    slug = _NON_SLUG_RE.sub('', slug)
+    slug = _DASHES_RE.sub('-', slug)
     return slug.strip('-')
 
 
-def sync_tags_to_collection(tags: list[str], db) -> None:
-    """Синхронизация тегов с коллекцией tags."""
-    if not tags:
+def sync_tags_to_collection(tags: list[str], db, now_iso: str = None) -> None:
+    """Синхронизация тегов с коллекцией tags.
+
+    Все теги уходят одним bulk_write: upsert по имени без учёта регистра (коллация
+    и индекс tags.name_ci, как в import_child_show) вместо поиска по $regex.
+    """
+    # Повторы одного тега (в т.ч. в другом регистре) складываем: первое написание
+    # становится именем нового тега, usage_count растёт на число вхождений
+    counts = Counter()
+    names = {}
+    for tag_name in tags or []:
+        tag_name = tag_name.strip()
+        if tag_name:
+            counts[names.setdefault(tag_name.casefold(), tag_name)] += 1
+    if not counts:
         return
     
-    for tag_name in tags:
-        tag_name = tag_name.strip()
-        if not tag_name:
-            continue
-        
-        existing = db.tags.find_one({
-            "name": {"$regex": f"^{re.escape(tag_name)}$", "$options": "i"}
-        })
-        
-        if not existing:
-            tag_doc = {
-                "_id": str(uuid4()),
-                "name": tag_name,
-                "slug": transliterate_slug(tag_name),
-                "old_id": None,
-                "usage_count": 1,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }
-            try:
-                db.tags.insert_one(tag_doc)
-            except Exception:
-                pass
-        else:
-            db.tags.update_one(
-                {"_id": existing["_id"]},
-                {"$inc": {"usage_count": 1}}
-            )
+    now = now_iso or datetime.now(timezone.utc).isoformat()
+    ids = uuid_batch(len(counts))
+    ops = [
+        pymongo.UpdateOne(
+            {"name": tag_name},
+            {
+                "$inc": {"usage_count": n},
+                "$setOnInsert": {
+                    "_id": tag_id,
+                    "slug": transliterate_slug(tag_name),
+                    "old_id": None,
+                    "created_at": now,
+                },
+            },
+            upsert=True,
+            collation=TAG_NAME_COLLATION,
+        )
+        for (tag_name, n), tag_id in zip(counts.items(), ids)
+    ]
+    try:
+        db.tags.bulk_write(ops, ordered=False)
+    except pymongo.errors.BulkWriteError as e:
+        for err in e.details.get('writeErrors', []):
+            print(f"  ⚠️  Failed to sync tag: {err.get('errmsg', err)}")
 
 
 def _load_tag_map():
@@ -147,8 +190,8 @@ def _load_tag_map():
     if not os.path.exists(TAG_MAP_FILE):
         return {}
     
-    with open(TAG_MAP_FILE, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    with open(TAG_MAP_FILE, 'rb') as f:
+        return json_loads(f.read())
 
 
 def _tags_from_tv(tv_tags_str: str, tag_map: dict) -> list[str]:
@@ -169,64 +212,82 @@ def _tags_from_tv(tv_tags_str: str, tag_map: dict) -> list[str]:
 
 def _parse_facts_table(table_html: str) -> dict:
     """Извлекает факты из HTML-таблицы."""
-    if not table_html:
+    # Без "</" строк таблицы быть не может — регулярку не запускаем
+    if not table_html or '</' not in table_html:
         return {}
 
     facts = {}
-    # Улучшенный regex для таблиц со style атрибутами
-    rows = re.findall(r'<tr[^>]*>\s*<td[^>]*>(.*?)</td>\s*<td[^>]*>(.*?)</td>\s*</tr>', table_html, re.IGNORECASE | re.DOTALL)
-    
-    for key_html, val_html in rows:
-        key = re.sub(r'<[^>]+>', '', key_html).strip()
+    for key_html, val_html in _FACTS_ROW_RE.findall(table_html):
+        key = (_HTML_TAG_RE.sub('', key_html) if '<' in key_html else key_html).strip()
+        if not key:
+            continue
         val = normalize_rich_text(val_html)
         
-        if key and val:
+        if val:
             facts[key] = val
     
     return facts
 
 
+# Дети всех шоу из одного разбора дампа: с --with-children get_child_shows зовётся
+# на каждое шоу, и каждый раз перечитывать весь humorbd.sql незачем
+# Ряды хранятся кортежами (id, title, slug): индекс покрывает всю modx_site_content,
+# а dict нужен только детям запрошенных шоу
+_CHILDREN_BY_PARENT: dict[int, list[tuple[int, str, str]]] | None = None
+
+
+def _load_children_index() -> dict[int, list[tuple[int, str, str]]]:
+    """parent_id -> [(id, title, slug)] по всем рядам INSERT INTO `modx_site_content`."""
+    global _CHILDREN_BY_PARENT
+    if _CHILDREN_BY_PARENT is not None:
+        return _CHILDREN_BY_PARENT
+
+    by_parent = defaultdict(list)
+    # mmap + поиск INSERT по байтам (как в import_child_show): дамп не читается в память
+    # целиком — страницы подтягивает ОС, а в str декодируется по одному INSERT-у
+    # modx_site_content за раз. Ряды и поля разбирают общие _split_rows/_split_fields
+    with _mmap_sql(SQL_FILE) as mm:
+        for _, blob in _iter_insert_blobs(mm, ("modx_site_content",)):
+            values_str = _values_body(blob)
+            if values_str is None:
+                continue
+            
+            for r in _split_rows(values_str):
+                parts = _split_fields(r)
+                if len(parts) > 12:
+                    try:
+                        rid = int(str(parts[0]).strip())
+                        parent = int(str(parts[12]).strip()) if parts[12] else 0
+                        title = str(parts[3]).strip("'\"") if parts[3] else ''
+                        slug = str(parts[6]).strip("'\"") if parts[6] else ''
+                        
+                        by_parent[parent].append((rid, title, slug))
+                    except:
+                        pass
+
+    _CHILDREN_BY_PARENT = dict(by_parent)
+    return _CHILDREN_BY_PARENT
+
+
 def get_child_shows(parent_id: int) -> list[dict]:
     """Получает список дочерних шоу для родительского."""
-    with open(SQL_FILE, 'r', encoding='utf-8', errors='replace') as f:
-        content = f.read()
-    
-    inserts = re.finditer(r'INSERT INTO `modx_site_content`.*?VALUES\s*(.*?);', content, re.DOTALL)
-    
-    children = []
-    for match in inserts:
-        values_str = match.group(1)
-        rows = _split_rows(values_str)
-        
-        for r in rows:
-            parts = _split_fields(r)
-            if len(parts) > 12:
-                try:
-                    rid = int(str(parts[0]).strip())
-                    parent = int(str(parts[12]).strip()) if parts[12] else 0
-                    title = str(parts[3]).strip("'\"") if parts[3] else ''
-                    slug = str(parts[6]).strip("'\"") if parts[6] else ''
-                    
-                    if parent == parent_id:
-                        children.append({
-                            'id': rid,
-                            'title': title,
-                            'slug': slug
-                        })
-                except:
-                    pass
-    
-    return children
+    return [
+        {'id': rid, 'title': title, 'slug': slug}
+        for rid, title, slug in _load_children_index().get(parent_id, ())
+    ]
 
 
-def build_show_doc(sc, tv_by_id: dict[str, str], tv_map: dict[str, str], image_map: dict[str, str], tag_map: dict[str, str], parent_mongo_id: str = None, parent_path: str = None, level: int = 0):
+def build_show_doc(sc, tv_by_id: dict[str, str], tv_map: dict[str, str], image_map: dict[str, str], tag_map: dict[str, str], parent_mongo_id: str = None, parent_path: str = None, level: int = 0, now_iso: str = None):
     """Строит документ шоу из данных SQL.
     
     Args:
         parent_mongo_id: MongoDB ID родительского шоу
         parent_path: Полный путь родителя (например 'comedy-battle')
         level: Уровень вложенности (0 = корневой, 1 = первый уровень и т.д.)
+        now_iso: Общая метка времени для created_at/updated_at (по умолчанию — сейчас)
     """
+    if now_iso is None:
+        now_iso = datetime.now(timezone.utc).isoformat()
     tv_named = {}
     for tv_id, val in tv_by_id.items():
         tv_name = tv_map.get(tv_id)
@@ -251,9 +312,8 @@ def build_show_doc(sc, tv_by_id: dict[str, str], tv_map: dict[str, str], image_m
             list_social = sec.get("list_social", "")
             if list_social:
                 try:
-                    import json
                     if isinstance(list_social, str):
-                        social_data = json.loads(list_social)
+                        social_data = json_loads(list_social)
                     else:
                         social_data = list_social
                     
@@ -265,14 +325,10 @@ def build_show_doc(sc, tv_by_id: dict[str, str], tv_map: dict[str, str], image_m
                                 
                                 if link:
                                     # Определяем тип ссылки
-                                    if 'vk.com' in link or 'vkontakte' in link:
-                                        social_links['vk'] = link
-                                    elif 'youtube' in link:
-                                        social_links['youtube'] = link
-                                    elif 'instagram' in link or 'instagr.am' in link:
-                                        social_links['instagram'] = link
-                                    elif 'telegram' in link or 't.me' in link:
-                                        social_links['telegram'] = link
+                                    for needle, key in _SOCIAL_MAP:
+                                        if needle in link:
+                                            social_links[key] = link
+                                            break
                                     else:
                                         # Всё остальное - официальный сайт
                                         social_links['website'] = link
@@ -281,7 +337,9 @@ def build_show_doc(sc, tv_by_id: dict[str, str], tv_map: dict[str, str], image_m
             
             break
 
-    # Извлекаем остальные модули
+    # Извлекаем остальные модули. Модулей не больше, чем секций плюс блок из info, так что
+    # id на все модули и сам документ берём одним чтением urandom
+    ids = iter(uuid_batch(2 + len(sections)))
     modules = []
     order = 1
     
@@ -291,15 +349,14 @@ def build_show_doc(sc, tv_by_id: dict[str, str], tv_map: dict[str, str], image_m
         cleaned_text = normalize_rich_text(first_text_block)
         
         # Проверяем, начинается ли текст с названия шоу
-        title_lower = sc.pagetitle.lower()
-        if cleaned_text.lower().startswith(f'<p>{title_lower}') or cleaned_text.lower().startswith(f'<h'):
+        cleaned_lower = cleaned_text.lower()
+        if cleaned_lower.startswith(f'<p>{sc.pagetitle.lower()}') or cleaned_lower.startswith('<h'):
             # Удаляем первый параграф/заголовок
-            import re
-            cleaned_text = re.sub(r'^<[ph]\d?>.*?</[ph]\d?>', '', cleaned_text, count=1, flags=re.IGNORECASE | re.DOTALL).strip()
+            cleaned_text = _LEADING_BLOCK_RE.sub('', cleaned_text, count=1).strip()
         
         if cleaned_text:
             modules.append({
-                'id': str(uuid4()),
+                'id': next(ids),
                 'type': 'text_block',
                 'order': order,
                 'title': '',
@@ -321,7 +378,7 @@ def build_show_doc(sc, tv_by_id: dict[str, str], tv_map: dict[str, str], image_m
             
             if content:
                 modules.append({
-                    'id': str(uuid4()),
+                    'id': next(ids),
                     'type': 'text_block',
                     'order': order,
                     'title': title,
@@ -339,7 +396,7 @@ def build_show_doc(sc, tv_by_id: dict[str, str], tv_map: dict[str, str], image_m
             
             if table_html:
                 modules.append({
-                    'id': str(uuid4()),
+                    'id': next(ids),
                     'type': 'text_block',
                     'order': order,
                     'title': title,
@@ -378,7 +435,7 @@ def build_show_doc(sc, tv_by_id: dict[str, str], tv_map: dict[str, str], image_m
         full_path = sc.alias
 
     doc = {
-        '_id': str(uuid4()),
+        '_id': next(ids),
         'content_type': 'show',
         'title': sc.pagetitle,
         'slug': sc.alias,
@@ -387,8 +444,8 @@ def build_show_doc(sc, tv_by_id: dict[str, str], tv_map: dict[str, str], image_m
         'name': sc.longtitle or sc.pagetitle,
         'status': 'published',
         'tags': tags,
-        'created_at': datetime.now(timezone.utc).isoformat(),
-        'updated_at': datetime.now(timezone.utc).isoformat(),
+        'created_at': now_iso,
+        'updated_at': now_iso,
         'facts': facts,
         'social_links': social_links,
         'description': normalize_rich_text(sc.description) if sc.description else '',
@@ -414,6 +471,31 @@ def build_show_doc(sc, tv_by_id: dict[str, str], tv_map: dict[str, str], image_m
     return doc
 
 
+# Сборка документов — чистый CPU на уже извлечённых данных: большие пачки собираются
+# в процессах (как в import_child_show), а запись в Mongo остаётся последовательной
+MIN_SHOWS_PER_WORKER = 10
+
+
+def _build_one(item, tv_map, image_map, tag_map, now_iso: str):
+    """(key, sc, tv_by_id, parent_mongo_id) -> (key, doc, None) или (key, None, ошибка).
+
+    Ошибка возвращается, а не пробрасывается: её поднимет основной цикл на своём шоу.
+    """
+    key, sc, tv_by_id, parent_mongo_id = item
+    try:
+        return key, build_show_doc(sc, tv_by_id, tv_map, image_map, tag_map, parent_mongo_id, now_iso=now_iso), None
+    except Exception as e:
+        return key, None, e
+
+
+def _build_docs(work: list, tv_map, image_map, tag_map, now_iso: str, workers: int | None) -> dict:
+    """[(key, sc, tv_by_id, parent_mongo_id)] -> {key: (doc, ошибка)}."""
+    results = build_in_pool(
+        _build_one, work, (tv_map, image_map, tag_map, now_iso), workers, MIN_SHOWS_PER_WORKER
+    )
+    return {key: (doc, err) for key, doc, err in results}
+
+
 def main():
     parser = argparse.ArgumentParser(description="Импорт шоу из SQL в MongoDB")
     parser.add_argument("--ids", nargs="+", type=int, help="Конкретные ID шоу для импорта")
@@ -422,23 +504,36 @@ def main():
     parser.add_argument("--dry-run", action="store_true", help="Только показать, не сохранять")
     parser.add_argument("--apply", action="store_true", help="Применить изменения")
     parser.add_argument("--with-children", action="store_true", default=False, help="Импортировать дочерние шоу")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help=f"Процессов для сборки документов (по умолчанию: все ядра, если в пачке от {PARALLEL_MIN_BATCH} шоу)",
+    )
     args = parser.parse_args()
 
     if not args.dry_run and not args.apply:
         print("Укажите --dry-run или --apply")
         return
 
+    # shows_list.json читается один раз: статусы меняются в памяти (по id, первая
+    # запись с этим id — как раньше) и сохраняются в конце прогона, а не после каждого шоу
+    shows_list = _load_shows_list()
+    shows_by_id = {}
+    for show in shows_list:
+        shows_by_id.setdefault(show['id'], show)
+
     # Определяем список ID для импорта
     target_ids = set()
     
     if args.ids:
         target_ids = set(args.ids)
     elif args.all or args.batch:
-        shows_list = _load_shows_list()
-        pending = [s for s in shows_list if s.get('status') == 'pending']
+        pending = (s for s in shows_list if s.get('status') == 'pending')
         
         if args.batch:
-            pending = pending[:args.batch]
+            # Останавливаемся на batch-м pending, не фильтруя весь список
+            pending = islice(pending, args.batch)
         
         target_ids = {s['id'] for s in pending}
         
@@ -456,102 +551,153 @@ def main():
     image_map = _load_image_map()
     tag_map = _load_tag_map()
 
-    # Подключение к MongoDB
-    client = None
+    # Подключение к MongoDB — общий клиент из utils (w=1, пул побольше, сжатие по
+    # MONGO_COMPRESSORS; закрывается при выходе из процесса)
     db = None
     if args.apply:
-        client = pymongo.MongoClient(MONGO_URL)
-        db = client[DB_NAME]
+        db = get_db()
+        # Индекс под upsert тегов с коллацией (без него запрос с collation идёт сканом)
+        ensure_tag_name_index(db)
+
+    # Дети нужны только при импорте с --with-children; их id добавляем к шоу, чтобы
+    # данные всех страниц собрать одним проходом по дампу, а не проходом на каждую
+    # (из индекса parent_id -> дети берём только id: title/slug детей дают их же ряды site_content)
+    child_ids_by_show = {}
+    if args.apply and args.with_children:
+        children_index = _load_children_index()
+        child_ids_by_show = {
+            show_id: [rid for rid, _, _ in children_index.get(show_id, ())] for show_id in target_ids
+        }
+    all_ids = set(target_ids)
+    for child_ids in child_ids_by_show.values():
+        all_ids.update(child_ids)
+    site_content, tv_values = _extract_for_ids(all_ids)
+    # Одна метка времени на весь прогон: created_at/updated_at/imported_at и теги
+    now_iso = datetime.now(timezone.utc).isoformat()
+
+    # Какие slug уже заняты — одним запросом на все шоу и детей вместо find_one на каждое
+    existing_slugs = set()
+    if args.apply:
+        existing_slugs = set(db.shows.distinct(
+            "slug",
+            {"slug": {"$in": [site_content[i].alias for i in all_ids if i in site_content]}},
+        ))
+
+    # Документы собираются заранее (в пуле на больших пачках): сначала родители, затем
+    # дети — им нужен _id родителя. Детей шоу, чей slug уже занят, не собираем: их пропустят
+    parent_built = _build_docs(
+        [(i, site_content[i], tv_values.get(i, {}), None) for i in sorted(target_ids) if i in site_content],
+        tv_map, image_map, tag_map, now_iso, args.workers,
+    )
+    child_work = []
+    if args.apply and args.with_children:
+        for show_id, (parent_doc, err) in parent_built.items():
+            if err is None and parent_doc['slug'] not in existing_slugs:
+                for child_id in child_ids_by_show[show_id]:
+                    if child_id in site_content:
+                        child_work.append((
+                            (show_id, child_id), site_content[child_id], tv_values.get(child_id, {}), parent_doc['_id']
+                        ))
+    child_built = _build_docs(child_work, tv_map, image_map, tag_map, now_iso, args.workers)
 
     imported_count = 0
     error_count = 0
     skipped_count = 0
     
-    for show_id in sorted(target_ids):
-        # Get parent show data
-        site_content, tv_values = _extract_for_ids({show_id})
-        sc = site_content.get(show_id)
+    try:
+        for show_id in sorted(target_ids):
+            # Get parent show data
+            sc = site_content.get(show_id)
         
-        if not sc:
-            print(f"⚠️  ID {show_id}: не найден в SQL")
-            if args.apply:
-                _mark_show_error(show_id, "Не найден в SQL")
-            error_count += 1
-            continue
+            if not sc:
+                print(f"⚠️  ID {show_id}: не найден в SQL")
+                if args.apply:
+                    _mark_show_error(shows_by_id, show_id, "Не найден в SQL")
+                error_count += 1
+                continue
 
-        tv_by_id = tv_values.get(show_id, {})
-        
-        try:
-            # Build parent show document
-            parent_doc = build_show_doc(sc, tv_by_id, tv_map, image_map, tag_map)
+            try:
+                # Parent show document (собран выше; ошибка сборки поднимается здесь)
+                parent_doc, err = parent_built[show_id]
+                if err is not None:
+                    raise err
             
-            # print(f"\n{'='*60}")
-            # print(f"ID {show_id}: {parent_doc['title']} ({parent_doc['slug']})")
-            # print(f"{'='*60}")
-            # print(f"Description: {parent_doc['description'][:100] if parent_doc['description'] else '(нет)'}...")
-            # print(f"Facts: {len(parent_doc['facts'])} items")
-            # for k, v in list(parent_doc['facts'].items())[:5]:
-            #     print(f"  - {k}: {v[:60] if len(v) > 60 else v}")
-            # if len(parent_doc['facts']) > 5:
-            #     print(f"  ... и ещё {len(parent_doc['facts']) - 5}")
-            # print(f"Modules: {len(parent_doc['modules'])}")
-            # for m in parent_doc['modules'][:5]:
-            #     title = m['title'] or '(Без заголовка)'
-            #     content_len = len(m['data']['content'])
-            #     print(f"  - {m['type']}: {title} ({content_len} chars)")
-            # if len(parent_doc['modules']) > 5:
-            #     print(f"  ... и ещё {len(parent_doc['modules']) - 5}")
-            # print(f"Tags: {len(parent_doc['tags'])} - {parent_doc['tags'][:5]}")
-            # print(f"Social links: {parent_doc.get('social_links', {})}")
-            # print(f"Poster: {parent_doc['poster']}")
-
-            if args.apply:
-                # Check if exists
-                existing = db.shows.find_one({"slug": parent_doc['slug']})
-                if existing:
-                    print(f"⚠️  Шоу с slug '{parent_doc['slug']}' уже существует, пропускаем")
-                    _mark_show_imported(show_id)  # Отмечаем как импортированное
-                    skipped_count += 1
-                    continue
+                # print(f"\n{'='*60}")
+                # print(f"ID {show_id}: {parent_doc['title']} ({parent_doc['slug']})")
+                # print(f"{'='*60}")
+                # print(f"Description: {parent_doc['description'][:100] if parent_doc['description'] else '(нет)'}...")
+                # print(f"Facts: {len(parent_doc['facts'])} items")
+                # for k, v in list(parent_doc['facts'].items())[:5]:
+                #     print(f"  - {k}: {v[:60] if len(v) > 60 else v}")
+                # if len(parent_doc['facts']) > 5:
+                #     print(f"  ... и ещё {len(parent_doc['facts']) - 5}")
+                # print(f"Modules: {len(parent_doc['modules'])}")
+                # for m in parent_doc['modules'][:5]:
+                #     title = m['title'] or '(Без заголовка)'
+                #     content_len = len(m['data']['content'])
+                #     print(f"  - {m['type']}: {title} ({content_len} chars)")
+                # if len(parent_doc['modules']) > 5:
+                #     print(f"  ... и ещё {len(parent_doc['modules']) - 5}")
+                # print(f"Tags: {len(parent_doc['tags'])} - {parent_doc['tags'][:5]}")
+                # print(f"Social links: {parent_doc.get('social_links', {})}")
+                # print(f"Poster: {parent_doc['poster']}")
+
+                if args.apply:
+                    # Check if exists
+                    if parent_doc['slug'] in existing_slugs:
+                        print(f"⚠️  Шоу с slug '{parent_doc['slug']}' уже существует, пропускаем")
+                        _mark_show_imported(shows_by_id, show_id, now_iso)  # Отмечаем как импортированное
+                        skipped_count += 1
+                        continue
+                    parent_mongo_id = parent_doc['_id']
+                    existing_slugs.add(parent_doc['slug'])
                 
-                # Sync tags
-                if parent_doc['tags']:
-                    sync_tags_to_collection(parent_doc['tags'], db)
+                    # Дети собираются до записи: ошибка сборки не оставит в базе родителя без них
+                    child_docs = []
+                    if args.with_children:
+                        child_ids = child_ids_by_show[show_id]
+                        print(f"\n📦 Дочерних шоу: {len(child_ids)}")
+                    
+                        for child_id in child_ids:
+                            if child_id in site_content:
+                                child_doc, err = child_built[(show_id, child_id)]
+                                if err is not None:
+                                    raise err
+                            
+                                # Check if child exists
+                                if child_doc['slug'] not in existing_slugs:
+                                    existing_slugs.add(child_doc['slug'])
+                                    child_docs.append(child_doc)
                 
-                # Insert parent
-                db.shows.insert_one(parent_doc)
-                parent_mongo_id = parent_doc['_id']
-                imported_count += 1
+                    # Insert parent
+                    db.shows.insert_one(parent_doc)
+                    imported_count += 1
                 
-                # Отмечаем в shows_list.json
-                _mark_show_imported(show_id)
-                # print(f"✅ Шоу импортировано и отмечено в shows_list.json")
+                    # Отмечаем в shows_list.json
+                    _mark_show_imported(shows_by_id, show_id, now_iso)
+                    # print(f"✅ Шоу импортировано и отмечено в shows_list.json")
+                
+                    # Все новые дети — одним insert_many (ordered=False: ошибка одного не мешает остальным)
+                    inserted_children = child_docs
+                    if child_docs:
+                        try:
+                            db.shows.insert_many(child_docs, ordered=False)
+                        except pymongo.errors.BulkWriteError as e:
+                            failed = set()
+                            for err in e.details.get('writeErrors', []):
+                                failed.add(err['index'])
+                                print(f"  ❌ {child_docs[err['index']]['title']}: {err.get('errmsg', err)}")
+                            inserted_children = [d for i, d in enumerate(child_docs) if i not in failed]
+                        for child_doc in inserted_children:
+                            print(f"  ✅ {child_doc['title']}")
+                
+                    # Теги родителя и вставленных детей — одной синхронизацией
+                    sync_tags_to_collection(
+                        [tag for doc in [parent_doc, *inserted_children] for tag in doc['tags']], db, now_iso
+                    )
                 
-                # Import children
-                if args.with_children:
-                    children = get_child_shows(show_id)
-                    print(f"\n📦 Дочерних шоу: {len(children)}")
-                    
-                    child_mongo_ids = []
-                    for child in children:
-                        child_site_content, child_tv_values = _extract_for_ids({child['id']})
-                        child_sc = child_site_content.get(child['id'])
-                        
-                        if child_sc:
-                            child_tv_by_id = child_tv_values.get(child['id'], {})
-                            child_doc = build_show_doc(child_sc, child_tv_by_id, tv_map, image_map, tag_map, parent_mongo_id)
-                            
-                            # Check if child exists
-                            existing_child = db.shows.find_one({"slug": child_doc['slug']})
-                            if not existing_child:
-                                if child_doc['tags']:
-                                    sync_tags_to_collection(child_doc['tags'], db)
-                                
-                                db.shows.insert_one(child_doc)
-                                child_mongo_ids.append(child_doc['_id'])
-                                print(f"  ✅ {child_doc['title']}")
-                    
                     # Update parent with child_show_ids
+                    child_mongo_ids = [d['_id'] for d in inserted_children]
                     if child_mongo_ids:
                         db.shows.update_one(
                             {"_id": parent_mongo_id},
@@ -559,16 +705,17 @@ def main():
                         )
                         print(f"\n✅ Обновлены child_show_ids у родителя ({len(child_mongo_ids)} детей)")
 
-        except Exception as e:
-            print(f"❌ Ошибка импорта ID {show_id}: {e}")
-            if args.apply:
-                _mark_show_error(show_id, str(e))
-            error_count += 1
-            import traceback
-            traceback.print_exc()
-
-    if client:
-        client.close()
+            except Exception as e:
+                print(f"❌ Ошибка импорта ID {show_id}: {e}")
+                if args.apply:
+                    _mark_show_error(shows_by_id, show_id, str(e))
+                error_count += 1
+                import traceback
+                traceback.print_exc()
+    finally:
+        # Статусы пишутся и при падении посреди пачки — прогресс не теряется
+        if args.apply and shows_list:
+            _save_shows_list(shows_list)
 
     print(f"\n{'='*60}")
     print(f"Результат:")